@@ -5,8 +5,35 @@
 #
 # SPDX-License-Identifier: GPL-3.0-or-later
 
-from .image_caption import ImageCaptionExtension
-from .table_caption import TableCaptionExtension
-from .caption import CaptionExtension
+from importlib import import_module
 
-__all__ = ['ImageCaptionExtension', 'TableCaptionExtension', 'CaptionExtension']
+# The extensions are imported on first access, so that loading one of them
+# through its entry point does not import the others.
+_EXTENSIONS = {
+    "ImageCaptionExtension": "image_caption",
+    "TableCaptionExtension": "table_caption",
+    "CaptionExtension": "caption",
+    "CrossReferenceExtension": "reference",
+    "CaptionListExtension": "lists",
+}
+
+__all__ = [
+    'ImageCaptionExtension',
+    'TableCaptionExtension',
+    'CaptionExtension',
+    'CrossReferenceExtension',
+    'CaptionListExtension',
+]
+
+
+def __getattr__(name):
+    module = _EXTENSIONS.get(name)
+    if module is None:
+        raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
+    value = getattr(import_module("." + module, __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
@@ -0,0 +1,11 @@
+# caption - Manage markdown captions
+#
+# Copyright (c) 2020-2023 flywire
+# Copyright (c) 2023 sanzoghenzo
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+import sys
+
+from .batch import main
+
+sys.exit(main())
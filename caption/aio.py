@@ -0,0 +1,161 @@
+"""
+caption - Manage markdown captions
+
+Asyncio API converting markdown in an executor, with a pool of Markdown
+instances and an in-memory cache of the results.
+
+https://github.com/flywire/caption
+Copyright (c) 2020-2023 flywire
+Copyright (c) 2023 sanzoghenzo
+
+SPDX-License-Identifier: GPL-3.0-or-later
+"""
+
+import asyncio
+import os
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import markdown
+
+from .cache import CACHED_ATTRIBUTES, cacheable, config_digest, source_key
+
+DEFAULT_EXTENSIONS = [
+    "tables",
+    "caption.image_caption",
+    "caption.table_caption",
+    "caption.caption",
+]
+
+
+class AsyncRenderer(object):
+    """
+    Convert markdown without blocking the event loop.
+
+    ``size`` Markdown instances are built up front with ``extensions`` and
+    ``extension_configs`` and each conversion borrows one of them in the
+    ``executor`` (a thread pool of ``size`` workers by default), so at most
+    ``size`` documents are converted at once and no instance is built per
+    request.
+
+    The results of the last ``cache_size`` distinct documents are kept,
+    keyed by the hash of the source and of the configuration of the
+    extensions, the latter computed once. As with `ConversionCache`, nothing
+    is kept when the image files are read (``image_dimensions``,
+    ``srcset_widths``). Requests for a document being converted wait for
+    that conversion instead of starting another one; it runs as a task of
+    its own, so cancelling any of the requests does not cancel it.
+    """
+
+    def __init__(
+        self,
+        extensions=None,
+        extension_configs=None,
+        size=None,
+        executor=None,
+        cache_size=256,
+        attributes=CACHED_ATTRIBUTES,
+    ):
+        extensions = DEFAULT_EXTENSIONS if extensions is None else extensions
+        self.size = size or os.cpu_count() or 1
+        self.instances = [
+            markdown.Markdown(
+                extensions=extensions, extension_configs=extension_configs or {}
+            )
+            for _ in range(self.size)
+        ]
+        # the instances share their configuration: hash it once
+        self.digest = config_digest(self.instances[0])
+        self.cacheable = cacheable(self.instances[0])
+        self.own_executor = executor is None
+        self.executor = executor or ThreadPoolExecutor(max_workers=self.size)
+        self.cache_size = cache_size
+        self.attributes = attributes
+        self.results = OrderedDict()
+        self.pending = {}
+        self.hits = 0
+        self.misses = 0
+        self._pool = None
+
+    @property
+    def pool(self):
+        # created on first use, in the running event loop
+        if self._pool is None:
+            self._pool = asyncio.Queue()
+            for md in self.instances:
+                self._pool.put_nowait(md)
+        return self._pool
+
+    def key(self, source, salt=""):
+        return source_key(self.digest, source, salt)
+
+    def _convert(self, md, source):
+        html = md.reset().convert(source)
+        attributes = {
+            name: getattr(md, name) for name in self.attributes if hasattr(md, name)
+        }
+        return {"html": html, "attributes": attributes}
+
+    async def render(self, source, salt=""):
+        """
+        Return the conversion of ``source`` as a dict with the ``html`` and
+        the ``attributes`` of the Markdown instance after the conversion
+        (e.g. ``captions``).
+
+        ``salt`` adds anything else the output depends on to the cache key.
+        The returned dict is shared by the requests for the same document and
+        must not be modified.
+        """
+        key = self.key(source, salt)
+        entry = self.results.get(key)
+        if entry is not None:
+            self.hits += 1
+            self.results.move_to_end(key)
+            return entry
+        task = self.pending.get(key)
+        if task is not None:
+            self.hits += 1
+        else:
+            self.misses += 1
+            task = asyncio.ensure_future(self._render(key, source))
+            # the exception is retrieved even if every request was cancelled
+            task.add_done_callback(lambda task: task.cancelled() or task.exception())
+            self.pending[key] = task
+        # cancelling a request leaves the conversion to the others
+        return await asyncio.shield(task)
+
+    async def _render(self, key, source):
+        try:
+            md = await self.pool.get()
+            try:
+                entry = await asyncio.get_running_loop().run_in_executor(
+                    self.executor, self._convert, md, source
+                )
+            finally:
+                self.pool.put_nowait(md)
+            if self.cache_size and self.cacheable:
+                self.results[key] = entry
+                while len(self.results) > self.cache_size:
+                    self.results.popitem(last=False)
+            return entry
+        finally:
+            del self.pending[key]
+
+    async def convert(self, source, salt=""):
+        """Return the HTML of ``source``."""
+        return (await self.render(source, salt))["html"]
+
+    def clear(self):
+        """Forget the cached results."""
+        self.results.clear()
+
+    def close(self):
+        """Shut the executor down, unless it was given."""
+        if self.own_executor:
+            self.executor.shutdown(wait=True)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.close()
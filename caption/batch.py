@@ -0,0 +1,307 @@
+"""
+caption - Manage markdown captions
+
+Batch conversion of a directory of markdown files with the caption
+extensions, distributed over a pool of processes.
+
+https://github.com/flywire/caption
+Copyright (c) 2020-2023 flywire
+Copyright (c) 2023 sanzoghenzo
+
+SPDX-License-Identifier: GPL-3.0-or-later
+"""
+
+import argparse
+import io
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import markdown
+
+from .cache import ConversionCache, config_digest
+from .manifest import MANIFEST_SUFFIX, write_manifest
+from .site import SiteNumbering, caption_prefixes, count_records, set_number_offsets
+
+DEFAULT_EXTENSIONS = [
+    "tables",
+    "caption.image_caption",
+    "caption.table_caption",
+    "caption.caption",
+]
+SOURCE_SUFFIXES = (".md", ".markdown")
+
+_md = None
+_manifest = False
+_cache = None
+
+
+class BatchResult(object):
+    """Totals of a batch conversion."""
+
+    def __init__(
+        self, files=0, source_bytes=0, output_bytes=0, seconds=0.0, unchanged=0
+    ):
+        self.files = files
+        self.source_bytes = source_bytes
+        self.output_bytes = output_bytes
+        self.seconds = seconds
+        self.unchanged = unchanged
+
+    def __str__(self):
+        seconds = self.seconds or 1e-9
+        text = "{} files, {:.1f} KiB in {:.2f} s ({:.1f} files/s, {:.1f} KiB/s)".format(
+            self.files,
+            self.source_bytes / 1024.0,
+            self.seconds,
+            self.files / seconds,
+            self.source_bytes / 1024.0 / seconds,
+        )
+        if self.unchanged:
+            text += ", {} unchanged".format(self.unchanged)
+        return text
+
+
+def find_sources(source, suffixes=SOURCE_SUFFIXES):
+    """Return the markdown files below ``source``, relative to it."""
+    found = []
+    for directory, _, files in os.walk(source):
+        for filename in files:
+            if filename.endswith(suffixes):
+                path = os.path.join(directory, filename)
+                found.append(os.path.relpath(path, source))
+    return sorted(found)
+
+
+def _init_worker(extensions, extension_configs, manifest=False, cache=None):
+    """Build the Markdown instance reused for all the files of a worker."""
+    global _md, _manifest, _cache
+    _md = markdown.Markdown(
+        extensions=extensions, extension_configs=extension_configs or {}
+    )
+    _manifest = manifest
+    _cache = ConversionCache(cache) if cache else None
+
+
+def _read(path):
+    with io.open(path, "r", encoding="utf-8") as source_file:
+        return source_file.read()
+
+
+def _convert_file(task):
+    """
+    Convert one file and write the result, and its caption manifest if
+    enabled.
+
+    Returns the byte counts and the number of captions of each kind.
+    """
+    source_path, output_path, offsets = task
+    text = _read(source_path)
+    salt = ""
+    if offsets is not None:
+        set_number_offsets(_md, offsets)
+        salt = json.dumps(offsets, sort_keys=True)
+    if _cache is not None:
+        html = _cache.convert(_md, text, salt)
+    else:
+        html = _md.reset().convert(text)
+    directory = os.path.dirname(output_path)
+    if directory and not os.path.isdir(directory):
+        try:
+            os.makedirs(directory)
+        except OSError:
+            # another worker created it in the meantime
+            if not os.path.isdir(directory):
+                raise
+    with io.open(output_path, "w", encoding="utf-8") as output_file:
+        output_file.write(html)
+    captions = getattr(_md, "captions", [])
+    if _manifest:
+        write_manifest(captions, os.path.splitext(output_path)[0] + MANIFEST_SUFFIX)
+    return len(text.encode("utf-8")), len(html.encode("utf-8")), count_records(captions)
+
+
+def convert_tree(
+    source,
+    destination,
+    jobs=None,
+    extensions=None,
+    extension_configs=None,
+    suffix=".html",
+    progress=None,
+    manifest=False,
+    cache=None,
+    numbering=None,
+):
+    """
+    Convert every markdown file below ``source`` into ``destination``.
+
+    Files are distributed over ``jobs`` processes (all the CPUs by default),
+    each reusing a single Markdown instance, and every result is written as
+    soon as it is converted. With ``manifest``, the caption records of each
+    file are written next to it in a JSON sidecar. ``cache`` is the directory
+    of a `ConversionCache` reused by unchanged files. ``numbering`` is the
+    state file of a `SiteNumbering` continuing the caption numbers across the
+    files, in path order; only the files edited since the previous build, or
+    whose numbers moved, are converted then. ``progress`` is called with the
+    running `BatchResult` after each file. Returns the final `BatchResult`,
+    counting each converted file once.
+    """
+    extensions = DEFAULT_EXTENSIONS if extensions is None else extensions
+    jobs = jobs or os.cpu_count() or 1
+    paths = find_sources(source)
+    offsets = dict.fromkeys(paths)
+
+    def output_path(path):
+        return os.path.join(destination, os.path.splitext(path)[0] + suffix)
+
+    def make_task(path):
+        return (os.path.join(source, path), output_path(path), offsets[path])
+
+    todo = paths
+    if numbering:
+        md = markdown.Markdown(
+            extensions=extensions, extension_configs=extension_configs or {}
+        )
+        site = SiteNumbering(numbering, caption_prefixes(md))
+        offsets = site.plan(
+            [(path, _read(os.path.join(source, path))) for path in paths],
+            config_digest(md),
+        )
+        outdated = set(site.modified()) | set(site.changed())
+
+        def missing(path):
+            output = output_path(path)
+            outputs = [output]
+            if manifest:
+                outputs.append(os.path.splitext(output)[0] + MANIFEST_SUFFIX)
+            return not all(os.path.exists(name) for name in outputs)
+
+        todo = [path for path in paths if path in outdated or missing(path)]
+
+    result = BatchResult(unchanged=len(paths) - len(todo))
+    started = time.perf_counter()
+    # sizes of the converted files, each counted once even if converted again
+    sizes = {}
+
+    def collect(paths, outcomes):
+        counts = {}
+        for path, (source_bytes, output_bytes, page_counts) in zip(paths, outcomes):
+            counts[path] = page_counts
+            previous = sizes.get(path, (0, 0))
+            sizes[path] = (source_bytes, output_bytes)
+            result.files = len(sizes)
+            result.source_bytes += source_bytes - previous[0]
+            result.output_bytes += output_bytes - previous[1]
+            result.seconds = time.perf_counter() - started
+            if progress:
+                progress(result)
+        return counts
+
+    def convert(paths):
+        tasks = [make_task(path) for path in paths]
+        if jobs == 1 or len(tasks) < 2:
+            _init_worker(extensions, extension_configs, manifest, cache)
+            return collect(paths, (_convert_file(task) for task in tasks))
+        # large chunks keep the inter-process traffic low on many small files
+        chunksize = max(1, len(tasks) // (jobs * 8))
+        with ProcessPoolExecutor(
+            max_workers=jobs,
+            initializer=_init_worker,
+            initargs=(extensions, extension_configs, manifest, cache),
+        ) as executor:
+            return collect(
+                paths, executor.map(_convert_file, tasks, chunksize=chunksize)
+            )
+
+    counts = convert(todo)
+    if numbering:
+        # the scan may miscount unusual pages: render the shifted pages again
+        stale = site.update(counts)
+        offsets = site.offsets
+        if stale:
+            result.unchanged -= len(set(stale) - set(todo))
+            convert(stale)
+        site.save()
+    result.seconds = time.perf_counter() - started
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m caption",
+        description="Convert a directory of markdown files to HTML with captions.",
+    )
+    parser.add_argument("source", help="directory containing the markdown files")
+    parser.add_argument("destination", help="directory receiving the HTML files")
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=None,
+        help="number of worker processes (default: number of CPUs)",
+    )
+    parser.add_argument(
+        "-x",
+        "--extension",
+        action="append",
+        default=[],
+        dest="extensions",
+        help="additional Markdown extension to load, can be repeated",
+    )
+    parser.add_argument(
+        "-c",
+        "--config",
+        help="JSON file mapping extension names to their configuration",
+    )
+    parser.add_argument(
+        "--suffix", default=".html", help="suffix of the output files"
+    )
+    parser.add_argument(
+        "-m",
+        "--manifest",
+        action="store_true",
+        help="write the caption records of each page to a JSON sidecar file",
+    )
+    parser.add_argument(
+        "--cache",
+        metavar="DIRECTORY",
+        help="reuse the conversions of unchanged pages cached in DIRECTORY",
+    )
+    parser.add_argument(
+        "--continuous",
+        metavar="STATE",
+        help="number the captions continuously across the files in path order, "
+        "keeping the counts in the STATE file between builds",
+    )
+    parser.add_argument(
+        "-q", "--quiet", action="store_true", help="only report the totals"
+    )
+    args = parser.parse_args(argv)
+
+    extension_configs = None
+    if args.config:
+        with io.open(args.config, "r", encoding="utf-8") as config_file:
+            extension_configs = json.load(config_file)
+
+    def progress(result):
+        sys.stderr.write("\r{}".format(result))
+
+    result = convert_tree(
+        args.source,
+        args.destination,
+        jobs=args.jobs,
+        extensions=DEFAULT_EXTENSIONS + args.extensions,
+        extension_configs=extension_configs,
+        suffix=args.suffix,
+        progress=None if args.quiet else progress,
+        manifest=args.manifest,
+        cache=args.cache,
+        numbering=args.continuous,
+    )
+    if not args.quiet:
+        sys.stderr.write("\n")
+    print(result)
+    return 0
@@ -0,0 +1,187 @@
+"""
+caption - Manage markdown captions
+
+On-disk cache of conversions, for development servers and watch modes that
+convert the same unchanged pages over and over.
+
+https://github.com/flywire/caption
+Copyright (c) 2020-2023 flywire
+Copyright (c) 2023 sanzoghenzo
+
+SPDX-License-Identifier: GPL-3.0-or-later
+"""
+
+import hashlib
+import io
+import json
+import os
+import tempfile
+
+# bump when a change of the package changes the output for a given input
+CACHE_VERSION = 3
+CACHED_ATTRIBUTES = (
+    "captions",
+    "caption_labels",
+    "caption_unresolved",
+    "toc",
+    "toc_tokens",
+    "Meta",
+)
+# options making the output depend on the image files, which are not hashed
+FILE_OPTIONS = ("image_dimensions", "srcset_widths")
+
+
+def extension_configs(md):
+    """
+    Return the configuration of the extensions registered with ``md``, as
+    returned by their ``getConfigs()``, in registration order.
+    """
+    return [
+        [type(extension).__name__, extension.getConfigs()]
+        for extension in md.registeredExtensions
+        if hasattr(extension, "getConfigs")
+    ]
+
+
+def class_name(value):
+    return "{}.{}".format(type(value).__module__, type(value).__name__)
+
+
+def pipeline(md):
+    """
+    Return the classes of the processors of ``md`` in their order, stage by
+    stage, including those of the extensions that never register.
+    """
+    registries = [
+        md.preprocessors,
+        md.parser.blockprocessors,
+        md.inlinePatterns,
+        md.treeprocessors,
+        md.postprocessors,
+    ]
+    return [
+        [class_name(processor) for processor in registry] for registry in registries
+    ]
+
+
+def cacheable(md):
+    """
+    Whether the output of ``md`` depends on its source and options only,
+    i.e. no extension reads the image files (see `FILE_OPTIONS`).
+    """
+    for extension in md.registeredExtensions:
+        if not hasattr(extension, "getConfigs"):
+            continue
+        configs = extension.getConfigs()
+        if any(configs.get(option) for option in FILE_OPTIONS):
+            return False
+    return True
+
+
+def config_digest(md):
+    """
+    Hash the output format, the extension configuration and the processors
+    of ``md``: everything the output depends on besides the source.
+    """
+    payload = json.dumps(
+        [CACHE_VERSION, md.output_format, extension_configs(md), pipeline(md)],
+        sort_keys=True,
+        default=repr,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def source_key(digest, source, salt=""):
+    """Hash ``source`` and ``salt`` with the `config_digest` ``digest``."""
+    key = hashlib.sha256(digest.encode("ascii"))
+    for part in (salt, source):
+        key.update(b"\0")
+        key.update(part.encode("utf-8"))
+    return key.hexdigest()
+
+
+def cache_key(md, source, salt=""):
+    """
+    Hash ``source`` together with the output format, the extension
+    configuration and the processors of ``md``.
+
+    ``salt`` adds anything else the output depends on, e.g. the page path
+    when relative links are rewritten.
+    """
+    return source_key(config_digest(md), source, salt)
+
+
+class ConversionCache(object):
+    """
+    Cache of the HTML and caption records of conversions, stored as one JSON
+    file per entry in ``directory``.
+
+    Entries are keyed by `cache_key`, so changing a page or any option of the
+    extensions invalidates exactly the affected entries. The Markdown
+    attributes named in ``attributes`` are saved along with the HTML and
+    restored on a hit.
+    """
+
+    def __init__(self, directory, attributes=CACHED_ATTRIBUTES):
+        self.directory = directory
+        self.attributes = attributes
+        self.hits = 0
+        self.misses = 0
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+
+    def path(self, key):
+        return os.path.join(self.directory, key + ".json")
+
+    def get(self, key):
+        """Return the stored entry for ``key``, or ``None``."""
+        try:
+            with io.open(self.path(key), "r", encoding="utf-8") as entry_file:
+                return json.load(entry_file)
+        except (IOError, OSError, ValueError):
+            return None
+
+    def set(self, key, entry):
+        """Store ``entry`` for ``key``, atomically."""
+        handle, temporary = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with io.open(handle, "w", encoding="utf-8") as entry_file:
+                entry_file.write(json.dumps(entry, ensure_ascii=False))
+            os.replace(temporary, self.path(key))
+        except BaseException:
+            os.remove(temporary)
+            raise
+
+    def convert(self, md, source, salt=""):
+        """
+        Return ``md.reset().convert(source)``, from the cache when possible.
+
+        On a hit the cached attributes are set on ``md`` as a conversion
+        would have. Conversions reading the image files are never cached,
+        see `cacheable`.
+        """
+        if not cacheable(md):
+            return md.reset().convert(source)
+        key = cache_key(md, source, salt)
+        entry = self.get(key)
+        if entry is not None:
+            self.hits += 1
+            md.reset()
+            for name, value in entry["attributes"].items():
+                setattr(md, name, value)
+            return entry["html"]
+        self.misses += 1
+        html = md.reset().convert(source)
+        attributes = {
+            name: getattr(md, name)
+            for name in self.attributes
+            if hasattr(md, name)
+        }
+        self.set(key, {"html": html, "attributes": attributes})
+        return html
+
+    def clear(self):
+        """Remove all the entries."""
+        for filename in os.listdir(self.directory):
+            if filename.endswith(".json"):
+                os.remove(os.path.join(self.directory, filename))
@@ -12,17 +12,119 @@ Copyright (c) 2019-2020 Philipp Trommler
 SPDX-License-Identifier: GPL-3.0-or-later
 """
 
+import re
+
+from markdown.preprocessors import Preprocessor
 from markdown.treeprocessors import Treeprocessor
 from markdown.extensions import Extension
+from markdown.util import HTML_PLACEHOLDER_RE, Registry
 from xml.etree import ElementTree
 
+DISPATCHER_NAME = "captiontreeprocessor"
+SCANNER_NAME = "captionscanpreprocessor"
+FENCE_OPENING_RE = re.compile(r"^( {0,3})(`{3,}|~{3,})(.*)$")
+EMPTY_BRACES_RE = re.compile(r"\s*\{\s*\}\s*$")
+CODE_BLOCK_RE = re.compile(
+    r"\s*<(?:pre\b|div\b[^>]*\bclass=\"[^\"]*\b(?:highlight|codehilite))"
+)
+CODE_CLASSES = frozenset(["highlight", "codehilite"])
+LABEL_RE = re.compile(r"\s*\{#([^\s{}]+)\}\s*$")
+ID_FORMAT = "_{name}-{number}"
+# shorter names accepted in the declarations of caption kinds
+KIND_ALIASES = {"tag": "content_tag", "class": "content_class"}
+HEADING_LEVELS = {"h{}".format(level): level for level in range(1, 7)}
+
+
+class CaptionContext(object):
+    """
+    State of a single caption run over one document.
+
+    A new context is created for every run, so that the processors themselves
+    only hold their configuration.
+    """
+
+    def __init__(self, md=None):
+        self.md = md
+        self.numbers = {}
+        self.captions = []
+        self.labels = {}
+        self.sections = [0] * 6
+        self.section_numbers = {}
+
+    def next_number(self, name):
+        """Count one more caption of kind ``name`` and return its number."""
+        number = self.numbers.get(name, 0) + 1
+        self.numbers[name] = number
+        return number
+
+    def enter_section(self, level):
+        """Count a heading of ``level``, which starts the deeper sections over."""
+        self.sections[level - 1] += 1
+        self.sections[level:] = [0] * (6 - level)
+
+    def next_section_number(self, name, level):
+        """
+        Count one more caption of kind ``name`` in the current section of
+        heading ``level`` and return its number, prefixed by the numbers of
+        the headings up to that level, e.g. "2.3" for level 1 or "1.2.3" for
+        level 2. The levels above the first heading of the document are left
+        out.
+
+        The captions outside any such section, before its first heading, are
+        numbered on their own, without a section: 1, 2...
+        """
+        self.next_number(name)
+        path = self.sections[:level]
+        key = (name, tuple(path) if path[-1] else None)
+        number = self.section_numbers.get(key, 0) + 1
+        self.section_numbers[key] = number
+        if not path[-1]:
+            return number
+        while not path[0]:
+            path = path[1:]
+        return ".".join(str(section) for section in path + [number])
+
+    def add_caption(self, kind, number, content, title, label=None, text=None):
+        """
+        Record the caption of the ``content`` element.
+
+        A caption with a ``label`` is also indexed for references, which are
+        rendered as ``text``.
+        """
+        record = {
+            "kind": kind,
+            "number": number,
+            "id": content.get("id"),
+            "title": title,
+            "label": label,
+        }
+        self.captions.append(record)
+        if label:
+            self.labels[label] = {
+                "kind": kind,
+                "number": number,
+                "id": record["id"],
+                "text": text,
+            }
+
 
 class CaptionTreeprocessor(Treeprocessor):
-    """Base class for Caption processors."""
+    """
+    Base class for Caption processors.
+
+    Processors keep no state between or during runs: everything belonging to
+    a document lives in the `CaptionContext` of the run, and everything
+    belonging to an element is passed along as the match returned by
+    `matches`. A processor can therefore be shared by Markdown instances
+    converting documents in different threads.
+    """
 
     name = ""
     content_tag = ""
     caption_tag = "figcaption"
+    # text (or tuple of texts) the source must contain for the processor to
+    # match anything
+    marker = None
 
     def __init__(
         self,
@@ -34,17 +136,44 @@ class CaptionTreeprocessor(Treeprocessor):
         content_class=None,
         link_process=None,
         caption_top=True,
+        number_offset=0,
+        section_level=0,
+        compact=False,
+        id_format=ID_FORMAT,
+        deep=False,
     ):
+        self.md = md
         self.caption_prefix = caption_prefix
         self.numbering = numbering
-        self.number = 0
         self.caption_prefix_class = caption_prefix_class
         self.caption_class = caption_class
         self.content_class = content_class
         self.link_process = link_process
         self.caption_top = caption_top
+        self.number_offset = number_offset
+        self.section_level = section_level
+        self.compact = compact
+        self.id_format = id_format or ID_FORMAT
+        # cosmetic whitespace around the elements, left out in compact mode
+        self.newline = None if compact else "\n"
+        self.deep = deep
+
+    def next_number(self, context):
+        """
+        Number the next caption of this processor in ``context``, within its
+        section if ``section_level`` is set.
+        """
+        if self.section_level:
+            return context.next_section_number(self.name, self.section_level)
+        return self.number_offset + context.next_number(self.name)
 
-    def build_content_element(self, par, caption, replace=True):
+    def element_id(self, number):
+        """Id of the content element of the caption numbered ``number``."""
+        return self.id_format.format(
+            name=self.name, number=str(number).replace(".", "-")
+        )
+
+    def build_content_element(self, par, caption, number, match=None, replace=True):
         """Format the content element containing the caption"""
         attrib = par.attrib
         if replace:
@@ -54,10 +183,11 @@ class CaptionTreeprocessor(Treeprocessor):
             par.set(k, v)
         if self.content_class:
             par.set("class", self.content_class)
-        par.set("id", "_{}-{}".format(self.name, self.number))
+        par.set("id", self.element_id(number))
         if replace:
-            par.text = "\n"
-        par.tail = "\n"
+            par.text = self.newline
+        if not self.compact:
+            par.tail = "\n"
 
     def add_caption_to_content(self, content, caption):
         if self.caption_top:
@@ -65,10 +195,10 @@ class CaptionTreeprocessor(Treeprocessor):
         else:
             content.append(caption)
 
-    def build_caption_element(self, title):
+    def build_caption_element(self, title, number, match=None):
         """Format the caption."""
         caption = ElementTree.Element(self.caption_tag)
-        caption.tail = "\n"
+        caption.tail = self.newline
 
         if self.caption_class:
             caption.set("class", self.caption_class)
@@ -78,12 +208,12 @@ class CaptionTreeprocessor(Treeprocessor):
         caption_prefix_span = ElementTree.SubElement(caption, "span")
         if title:
             caption_prefix_span.text = "{}&nbsp;{}:".format(
-                self.caption_prefix, self.number
+                self.caption_prefix, number
             )
             caption_prefix_span.tail = " {}".format(title)
         else:
             caption_prefix_span.text = "{}&nbsp;{}".format(
-                self.caption_prefix, self.number
+                self.caption_prefix, number
             )
             caption_prefix_span.tail = ""
         if self.caption_prefix_class:
@@ -94,35 +224,431 @@ class CaptionTreeprocessor(Treeprocessor):
         """
         Whether the element tree part matches the object to be captioned.
 
+        A true return value is handed back to the other methods as ``match``.
         This will be overriden by the subclasses.
         """
         raise NotImplementedError
 
-    def get_title(self, par):
+    def get_title(self, par, match=None):
         """Title of the element. This will be overriden by the subclasses."""
         raise NotImplementedError
 
+    def split_label(self, par, title):
+        """
+        Split the ``{#label}`` suffix of ``title``, returning the title
+        without it and the label.
+
+        When the suffix is missing, the id of ``par`` (e.g. set by
+        ``attr_list``) is the label.
+        """
+        match = LABEL_RE.search(title) if title else None
+        if match is None:
+            return title, par.get("id")
+        return title[: match.start()], match.group(1)
+
+    def reference_text(self, number):
+        """Text of the references to the caption numbered ``number``."""
+        return "{}&nbsp;{}".format(self.caption_prefix, number)
+
+    def process(self, parent, par, following, context):
+        """
+        Caption ``par`` if it matches.
+
+        ``parent`` is the element holding ``par`` and ``following`` its next
+        sibling, or ``None`` if ``par`` is the last child. Returns ``None``
+        when ``par`` is not handled, otherwise whether ``par`` stays in the
+        tree.
+        """
+        match = self.matches(par)
+        if not match:
+            return None
+        self.caption(par, match, context)
+        return True
+
+    def caption(self, par, match, context):
+        """Number and caption the matched ``par``, recording it in ``context``."""
+        number = self.next_number(context)
+        title, label = self.split_label(par, self.get_title(par, match))
+        caption = self.build_caption_element(title, number, match)
+        self.build_content_element(par, caption, number, match)
+        self.add_caption_to_content(par, caption)
+        context.add_caption(
+            self.name, number, par, title, label, self.reference_text(number)
+        )
+
     def run(self, root):
         """Find and format all captions."""
-        for par in root.findall("./p"):
-            if not self.matches(par):
+        dispatch(root, [self], CaptionContext(self.md))
+
+
+def dispatch(root, processors, context):
+    """
+    Walk the children of ``root`` once, handing each paragraph to the first
+    of ``processors`` that handles it.
+
+    Paragraphs dropped by a processor are left out when the child list is
+    rebuilt at the end, so the walk stays linear in the number of children.
+    Headings are counted on the way when a processor numbers by section.
+    If any of the processors is ``deep``, see `dispatch_deep`.
+    """
+    if any(processor.deep for processor in processors):
+        dispatch_deep(root, processors, context)
+        return
+    children = list(root)
+    last = len(children) - 1
+    kept = []
+    sections = any(processor.section_level for processor in processors)
+    for index, child in enumerate(children):
+        if sections and child.tag in HEADING_LEVELS:
+            context.enter_section(HEADING_LEVELS[child.tag])
+        elif child.tag == "p":
+            following = children[index + 1] if index < last else None
+            keep = None
+            for processor in processors:
+                keep = processor.process(root, child, following, context)
+                if keep is not None:
+                    break
+            if keep is False:
+                continue
+        kept.append(child)
+    if len(kept) != len(children):
+        root[:] = kept
+
+
+def dispatch_deep(root, processors, context):
+    """
+    Walk the whole tree below ``root`` once, in document order, handing each
+    paragraph to the first of ``processors`` that handles it: any of them at
+    the top level, only the ``deep`` ones in nested elements such as list
+    items, blockquotes or admonitions.
+
+    The walk is an iterative preorder traversal with an explicit stack, so
+    the depth of the document is not limited by recursion. Every parent
+    gets its own list of kept children, rebuilt once if a paragraph was
+    dropped, which keeps the walk linear in the size of the tree.
+    """
+    deep = [processor for processor in processors if processor.deep]
+    sections = any(processor.section_level for processor in processors)
+    # frames of [parent, children, next index, kept children]
+    stack = [[root, list(root), 0, []]]
+    while stack:
+        frame = stack[-1]
+        parent, children, index, kept = frame
+        if index == len(children):
+            stack.pop()
+            if len(kept) != len(children):
+                parent[:] = kept
+            continue
+        frame[2] = index + 1
+        child = children[index]
+        tag = child.tag
+        if sections and tag in HEADING_LEVELS:
+            context.enter_section(HEADING_LEVELS[tag])
+        elif tag == "p":
+            following = children[index + 1] if index + 1 < len(children) else None
+            keep = None
+            for processor in processors if parent is root else deep:
+                keep = processor.process(parent, child, following, context)
+                if keep is not None:
+                    break
+            if keep is False:
                 continue
-            self.number += 1
-            title = self.get_title(par)
-            caption = self.build_caption_element(title)
-            self.build_content_element(par, caption)
-            self.add_caption_to_content(par, caption)
+        elif len(child) and isinstance(tag, str):
+            kept.append(child)
+            stack.append([child, list(child), 0, []])
+            continue
+        kept.append(child)
+
+
+def has_marker(text, marker):
+    """
+    Whether ``text`` contains ``marker``, any of them for a tuple of markers,
+    a match of it for a compiled pattern, ``None`` standing for any text.
+    """
+    if marker is None:
+        return True
+    if isinstance(marker, tuple):
+        return any(item in text for item in marker)
+    if hasattr(marker, "search"):
+        return marker.search(text) is not None
+    return marker in text
+
+
+def marker_pattern(markers):
+    """Compile a pattern finding any of ``markers`` in one search."""
+    markers = sorted(markers, key=len, reverse=True)
+    return re.compile("|".join(re.escape(marker) for marker in markers))
+
+
+class CaptionDispatcher(Treeprocessor):
+    """
+    Run all the registered caption processors in a single tree walk.
+
+    The caption extensions share one dispatcher per Markdown instance, see
+    `get_dispatcher`. After each run, the records of all the captions of the
+    document are available as ``md.captions``, a list of dicts with the
+    ``kind``, ``number``, ``id``, ``title`` and ``label`` of each caption,
+    and the labelled captions are indexed by label in ``md.caption_labels``.
+    """
+
+    def __init__(self, md=None):
+        super(CaptionDispatcher, self).__init__(md)
+        self.processors = Registry()
+        self.candidates = None
+        # replaces dispatch() when instrumentation is enabled, see caption.stats
+        self.instrument = None
+
+    def scan(self, text):
+        """
+        Note which processors can match anything in the source ``text``,
+        so that the next run skips the others.
+        """
+        self.candidates = [
+            processor
+            for processor in self.processors
+            if has_marker(text, processor.marker)
+        ]
+
+    def register(self, processor, name, priority):
+        """Add a caption processor; it replaces any processor named ``name``."""
+        self.processors.register(processor, name, priority)
+
+    def reset(self):
+        self.md.captions = []
+        self.md.caption_labels = {}
+
+    def run(self, root):
+        """Find and format all captions."""
+        processors = self.candidates
+        if processors is None:
+            processors = list(self.processors)
+        self.candidates = None
+        context = CaptionContext(self.md)
+        if self.instrument is not None:
+            self.instrument(root, processors, context)
+        elif processors:
+            dispatch(root, processors, context)
+        self.md.captions = context.captions
+        self.md.caption_labels = context.labels
+
+
+class CaptionScanPreprocessor(Preprocessor):
+    """Let the dispatcher skip the processors the source gives nothing to do."""
+
+    def __init__(self, md, dispatcher):
+        super(CaptionScanPreprocessor, self).__init__(md)
+        self.dispatcher = dispatcher
+
+    def run(self, lines):
+        self.dispatcher.scan("\n".join(lines))
+        return lines
+
+
+def get_dispatcher(md):
+    """Return the caption dispatcher of ``md``, registering it on first use."""
+    if DISPATCHER_NAME not in md.treeprocessors:
+        dispatcher = CaptionDispatcher(md)
+        md.treeprocessors.register(dispatcher, DISPATCHER_NAME, 8)
+        # after the other preprocessors, which may add content (e.g. snippets)
+        md.preprocessors.register(
+            CaptionScanPreprocessor(md, dispatcher), SCANNER_NAME, 0
+        )
+        md.registerExtension(dispatcher)
+        dispatcher.reset()
+    return md.treeprocessors[DISPATCHER_NAME]
 
 
 class ListingCaptionTreeProcessor(CaptionTreeprocessor):
     name = "listing"
     content_tag = "div class=listing"
+    prefix = "Listing: "
+    marker = "Listing: "
+
+    def __init__(
+        self,
+        md=None,
+        name=None,
+        prefix=None,
+        content_tag=None,
+        code_blocks=False,
+        **kwargs
+    ):
+        super(ListingCaptionTreeProcessor, self).__init__(md, **kwargs)
+        if name:
+            self.name = name
+        if prefix:
+            self.prefix = self.marker = prefix
+        if content_tag:
+            self.content_tag = content_tag
+        self.code_blocks = code_blocks
 
     def matches(self, par):
-        return par.text and par.text.startswith("Listing: ")
+        return par.text and par.text.startswith(self.prefix)
+
+    def get_title(self, par, match=None):
+        return par.text[len(self.prefix):]
+
+    def stashed_code(self, element, context):
+        """
+        Return the index in the HTML stash of the code block ``element`` is
+        the placeholder paragraph of, or ``None``.
+        """
+        if element.tag != "p" or len(element) or not element.text:
+            return None
+        match = HTML_PLACEHOLDER_RE.match(element.text)
+        if match is None or match.end() != len(element.text):
+            return None
+        blocks = context.md.htmlStash.rawHtmlBlocks
+        index = int(match.group(1))
+        if index >= len(blocks) or not CODE_BLOCK_RE.match(str(blocks[index])):
+            return None
+        return index
+
+    def code_block(self, element, context):
+        """
+        Whether ``element`` is a code block: a ``pre`` element, a highlighted
+        block or the placeholder paragraph of a stashed one.
+        """
+        if element is None:
+            return False
+        if element.tag == "pre":
+            return True
+        if element.tag == "div":
+            return bool(CODE_CLASSES & set(element.get("class", "").split()))
+        return self.stashed_code(element, context) is not None
+
+    def process(self, parent, par, following, context):
+        """
+        Caption ``par``, or with ``code_blocks``, the code block following
+        it, which is then wrapped in a figure while ``par`` is dropped.
+
+        A stashed code block is recognised from its placeholder paragraph
+        and stays in the HTML stash, to be inserted by Markdown as usual.
+        """
+        match = self.matches(par)
+        if not match:
+            return None
+        if not (self.code_blocks and self.code_block(following, context)):
+            self.caption(par, match, context)
+            return True
+        number = self.next_number(context)
+        title, label = self.split_label(par, self.get_title(par, match))
+        caption = self.build_caption_element(title, number, match)
+        index = self.stashed_code(following, context)
+        if index is not None:
+            # the figure adds its own newlines
+            blocks = context.md.htmlStash.rawHtmlBlocks
+            blocks[index] = str(blocks[index]).rstrip()
+        code = ElementTree.Element(following.tag, dict(following.attrib))
+        code.text = following.text
+        code.extend(list(following))
+        code.tail = self.newline
+        following.clear()
+        following.tag = "figure"
+        following.set("class", self.content_class or self.name)
+        following.set("id", self.element_id(number))
+        following.text = self.newline
+        # a stashed block would be followed by a blank line
+        following.tail = "\n"
+        following.append(code)
+        self.add_caption_to_content(following, caption)
+        context.add_caption(
+            self.name, number, following, title, label, self.reference_text(number)
+        )
+        return False
 
-    def get_title(self, par):
-        return par.text[9:]
+
+class CodeCaptionPreprocessor(Preprocessor):
+    """
+    Turn the caption attribute of a fence, e.g. ``{ .python caption="Setup" }``,
+    into a listing paragraph before the code block.
+    """
+
+    def __init__(self, md, attribute, prefix):
+        super(CodeCaptionPreprocessor, self).__init__(md)
+        self.attribute = attribute
+        self.prefix = prefix
+        self.attribute_re = re.compile(
+            r"""\s*\b{}\s*=\s*(?:"([^"]*)"|'([^']*)')""".format(re.escape(attribute))
+        )
+
+    def run(self, lines):
+        if not any(self.attribute in line for line in lines):
+            return lines
+        new_lines = []
+        fence = None
+        for line in lines:
+            match = FENCE_OPENING_RE.match(line)
+            if fence is not None:
+                closing = match and match.group(2).startswith(fence)
+                if closing and not match.group(3).strip():
+                    fence = None
+            elif match:
+                fence = match.group(2)
+                attribute = self.attribute_re.search(match.group(3))
+                if attribute is not None and "{" in match.group(3):
+                    title = attribute.group(1)
+                    if title is None:
+                        title = attribute.group(2)
+                    attributes = self.attribute_re.sub("", match.group(3), count=1)
+                    line = line[: match.start(3)] + attributes
+                    line = EMPTY_BRACES_RE.sub("", line)
+                    new_lines.extend(["", self.prefix + title, ""])
+            new_lines.append(line)
+        return new_lines
+
+
+class PrefixMatcher(object):
+    """
+    Find which of many prefixes a text starts with.
+
+    The prefixes are looked up in a dict, once per distinct prefix length,
+    so the cost does not grow with the number of prefixes. The longest
+    prefix wins.
+    """
+
+    def __init__(self, values):
+        self.values = dict(values)
+        self.lengths = sorted({len(prefix) for prefix in self.values}, reverse=True)
+
+    def match(self, text):
+        """Return the value of the prefix ``text`` starts with, or ``None``."""
+        values = self.values
+        for length in self.lengths:
+            value = values.get(text[:length])
+            if value is not None:
+                return value
+        return None
+
+
+class CaptionKindsTreeProcessor(CaptionTreeprocessor):
+    """
+    Caption the paragraphs starting with the prefix of any of several kinds,
+    e.g. "Listing: " or "Equation: ".
+
+    ``kinds`` are `ListingCaptionTreeProcessor` instances, each with its own
+    prefix, tag, classes and counter. A paragraph is matched against all of
+    them with one `PrefixMatcher` lookup, then captioned by its kind.
+    """
+
+    name = "kinds"
+
+    def __init__(self, md=None, kinds=()):
+        super(CaptionKindsTreeProcessor, self).__init__(md)
+        self.kinds = list(kinds)
+        self.matcher = PrefixMatcher((kind.prefix, kind) for kind in self.kinds)
+        # one search of the source, however many kinds there are
+        self.marker = marker_pattern(kind.prefix for kind in self.kinds)
+        self.section_level = max([kind.section_level for kind in self.kinds] or [0])
+        self.deep = any(kind.deep for kind in self.kinds)
+        self.code_blocks = any(kind.code_blocks for kind in self.kinds)
+
+    def process(self, parent, par, following, context):
+        text = par.text
+        kind = self.matcher.match(text) if text else None
+        if kind is None:
+            return None
+        return kind.process(parent, par, following, context)
 
 
 class CaptionExtension(Extension):
@@ -144,15 +670,80 @@ class CaptionExtension(Extension):
             "content_class": ["", "CSS class to add to the content element."],
             "link_process": ["", "Some content types support linked processes."],
             "caption_top": [False, "Put the caption at the top of the content."],
+            "number_offset": [0, "Number of listings preceding the document."],
+            "section_level": [
+                0,
+                "Number the listings within the sections of this heading level.",
+            ],
+            "compact": [False, "Leave the cosmetic whitespace out of the HTML."],
+            "id_format": [ID_FORMAT, "Format of the ids, from {name} and {number}."],
+            "deep": [False, "Also caption the paragraphs of nested elements."],
+            "code_blocks": [
+                False,
+                "Wrap the code block following a listing caption in its figure.",
+            ],
+            "code_attribute": [
+                "caption",
+                "Fence attribute giving the listing caption of a code block, "
+                "with code_blocks.",
+            ],
+            "kinds": [
+                [],
+                "Additional kinds of captions, as dicts with at least a `name` and "
+                "the `prefix` starting their paragraphs.",
+            ],
         }
         super(CaptionExtension, self).__init__(**kwargs)
 
+    def build_kinds(self, md, configs, kinds):
+        """
+        Build a processor for each kind, the options of the extension being
+        the defaults. The listing kind is included unless overridden.
+        """
+        processors = []
+        if not any(kind["name"] == "listing" for kind in kinds):
+            processors.append(ListingCaptionTreeProcessor(md, **configs))
+        allowed = set(configs) | set(["name", "prefix", "content_tag"])
+        for kind in kinds:
+            kind = dict(
+                (KIND_ALIASES.get(key, key), value) for key, value in kind.items()
+            )
+            for key in kind:
+                if key not in allowed:
+                    raise KeyError(
+                        "Unknown option {!r} of the caption kind {!r}".format(
+                            key, kind.get("name")
+                        )
+                    )
+            options = dict(configs)
+            options["caption_prefix"] = kind["prefix"].rstrip(": ")
+            options["content_tag"] = "div"
+            options["content_class"] = configs["content_class"] or kind["name"]
+            options.update(kind)
+            processors.append(ListingCaptionTreeProcessor(md, **options))
+        return processors
+
     def extendMarkdown(self, md):
-        md.treeprocessors.register(
-            ListingCaptionTreeProcessor(md, **self.getConfigs()),
-            "listingcaptiontreeprocessor",
-            8,
-        )
+        md.registerExtension(self)
+        configs = self.getConfigs()
+        kinds = configs.pop("kinds")
+        code_attribute = configs.pop("code_attribute")
+        if kinds:
+            processor = CaptionKindsTreeProcessor(
+                md, self.build_kinds(md, configs, kinds)
+            )
+            listings = [kind for kind in processor.kinds if kind.name == "listing"]
+        else:
+            processor = ListingCaptionTreeProcessor(md, **configs)
+            listings = [processor]
+        get_dispatcher(md).register(processor, "listingcaptiontreeprocessor", 8)
+        if configs["code_blocks"] and code_attribute and listings:
+            # before fenced_code (25)
+            md.preprocessors.register(
+                CodeCaptionPreprocessor(md, code_attribute, listings[0].prefix),
+                "codecaptionpreprocessor",
+                45,
+            )
 
 
 def makeExtension(**kwargs):
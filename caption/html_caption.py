@@ -0,0 +1,301 @@
+"""
+caption - Manage markdown captions
+
+Captioning of already rendered HTML, in a streaming pass.
+
+https://github.com/flywire/caption
+Copyright (c) 2020-2023 flywire
+Copyright (c) 2023 sanzoghenzo
+
+SPDX-License-Identifier: GPL-3.0-or-later
+"""
+
+import argparse
+import io
+import re
+import sys
+from html.parser import HTMLParser
+from xml.etree import ElementTree
+
+import markdown
+
+from .caption import HEADING_LEVELS, CaptionContext, dispatch_deep, get_dispatcher
+
+EXTENSIONS = ["caption.image_caption", "caption.table_caption", "caption.caption"]
+VOID_TAGS = frozenset(
+    [
+        "area",
+        "base",
+        "br",
+        "col",
+        "embed",
+        "hr",
+        "img",
+        "input",
+        "link",
+        "meta",
+        "param",
+        "source",
+        "track",
+        "wbr",
+    ]
+)
+# top level blocks the caption processors look into
+BUILT_TAGS = frozenset(["p", "table"])
+# and the code blocks, for the processors wrapping them
+CODE_TAGS = frozenset(["pre", "div"])
+ATTRIBUTE_RE = re.compile(
+    r"""([^\s/>"'=]+)(?:\s*=\s*(?:"([^"]*)"|'([^']*)'|([^\s"'=<>`]+)))?"""
+)
+TAG_NAME_RE = re.compile(r"<[^\s/>]+")
+
+
+def raw_attributes(starttag):
+    """Attributes of the tag ``starttag`` with their values left escaped."""
+    body = TAG_NAME_RE.sub("", starttag, count=1).rstrip(">").rstrip("/")
+    attributes = []
+    for match in ATTRIBUTE_RE.finditer(body):
+        value = next((group for group in match.groups()[1:] if group is not None), "")
+        attributes.append((match.group(1).lower(), value))
+    return attributes
+
+
+class Block(object):
+    """A top level element of the HTML, followed by the text after it."""
+
+    def __init__(self, tag, build=False):
+        self.tag = tag
+        self.raw = []
+        self.tail = []
+        build = build or tag in BUILT_TAGS
+        self.builder = ElementTree.TreeBuilder() if build else None
+        self.element = None
+        self.changed = False
+        self.dropped = False
+
+
+class CaptionHTMLParser(HTMLParser):
+    """
+    Apply the caption processors of ``md`` to HTML fed in chunks, passing
+    the result to ``write`` as it goes.
+
+    The HTML is split into its top level elements. Paragraphs and tables
+    are parsed into element trees and handed to the processors exactly like
+    the children of the Markdown tree, then serialized by ``md``, so the
+    output is the one the extensions give. Everything else is copied as is.
+    At most two top level elements are held at any time: a paragraph waits
+    for the element following it, which may be the table it captions.
+
+    If any of the processors is ``deep``, every top level element is parsed,
+    and the paragraphs nested in it are captioned as `dispatch_deep` does.
+    """
+
+    def __init__(self, md, write):
+        super(CaptionHTMLParser, self).__init__(convert_charrefs=False)
+        self.md = md
+        self.write = write
+        self.processors = list(get_dispatcher(md).processors)
+        self.sections = any(processor.section_level for processor in self.processors)
+        self.deep = any(processor.deep for processor in self.processors)
+        code_blocks = any(
+            getattr(processor, "code_blocks", False) for processor in self.processors
+        )
+        self.code_tags = CODE_TAGS if code_blocks else frozenset()
+        self.context = CaptionContext(md)
+        self.root = ElementTree.Element("div")
+        self.blocks = []
+        self.current = None
+        self.depth = 0
+
+    def text(self, raw):
+        if self.current is not None:
+            self.current.raw.append(raw)
+            if self.current.builder is not None:
+                self.current.builder.data(raw)
+        elif self.blocks:
+            self.blocks[-1].tail.append(raw)
+        else:
+            self.write(raw)
+
+    def start(self, tag, attrs, void):
+        raw = self.get_starttag_text()
+        if self.current is None:
+            self.current = Block(tag, self.deep or tag in self.code_tags)
+            self.blocks.append(self.current)
+        self.current.raw.append(raw)
+        if self.current.builder is not None:
+            self.current.builder.start(tag, dict(raw_attributes(raw)))
+            if void:
+                self.current.builder.end(tag)
+        if void:
+            if self.depth == 0:
+                self.finish()
+        else:
+            self.depth += 1
+
+    def handle_starttag(self, tag, attrs):
+        self.start(tag, attrs, tag in VOID_TAGS)
+
+    def handle_startendtag(self, tag, attrs):
+        self.start(tag, attrs, True)
+
+    def handle_endtag(self, tag):
+        if self.current is None:
+            self.text("</{}>".format(tag))
+            return
+        self.current.raw.append("</{}>".format(tag))
+        if self.current.builder is not None:
+            self.current.builder.end(tag)
+        self.depth -= 1
+        if self.depth == 0:
+            self.finish()
+
+    def handle_data(self, data):
+        self.text(data)
+
+    def handle_entityref(self, name):
+        self.text("&{};".format(name))
+
+    def handle_charref(self, name):
+        self.text("&#{};".format(name))
+
+    def handle_comment(self, data):
+        self.text("<!--{}-->".format(data))
+
+    def handle_decl(self, decl):
+        self.text("<!{}>".format(decl))
+
+    def handle_pi(self, data):
+        self.text("<?{}>".format(data))
+
+    def unknown_decl(self, data):
+        self.text("<![{}]>".format(data))
+
+    def finish(self):
+        """Close the current top level element and process the one before."""
+        block = self.current
+        self.current = None
+        if block.builder is not None:
+            block.element = block.builder.close()
+            block.builder = None
+        if len(self.blocks) > 1:
+            self.flush(self.blocks.pop(0), block)
+
+    def flush(self, block, following=None):
+        """Caption ``block`` if it matches, then write it."""
+        if self.sections and block.tag in HEADING_LEVELS:
+            self.context.enter_section(HEADING_LEVELS[block.tag])
+        element = block.element
+        tail = "".join(block.tail)
+        if element is not None and element.tail is None:
+            # unless set by the processor that captioned it as the following
+            element.tail = tail
+        if block.tag == "p" and element is not None and not block.changed:
+            next_element = None
+            if following is not None:
+                next_element = following.element
+                if next_element is None:
+                    # only its tag matters to the processors
+                    next_element = ElementTree.Element(following.tag)
+            keep = None
+            for processor in self.processors:
+                keep = processor.process(self.root, element, next_element, self.context)
+                if keep is not None:
+                    break
+            if keep is False:
+                block.dropped = True
+                following.changed = True
+            elif keep:
+                block.changed = True
+        elif self.deep and element is not None and block.tag not in HEADING_LEVELS:
+            block.changed = block.changed or self.caption_nested(element)
+        if block.dropped:
+            return
+        if block.changed:
+            html = self.md.serializer(element)
+            for processor in self.md.postprocessors:
+                html = processor.run(html)
+            if following is None and not tail.strip():
+                # Markdown strips the whitespace the processors leave at the end
+                html = html.rstrip() + tail
+            self.write(html)
+        else:
+            self.write("".join(block.raw) + tail)
+
+    def caption_nested(self, element):
+        """Caption the paragraphs nested in ``element``; return whether any was."""
+        count = len(self.context.captions)
+        wrapper = ElementTree.Element("div")
+        wrapper.append(element)
+        dispatch_deep(wrapper, self.processors, self.context)
+        return len(self.context.captions) != count
+
+    def close(self):
+        super(CaptionHTMLParser, self).close()
+        unclosed = self.current
+        if unclosed is not None:
+            self.blocks.remove(unclosed)
+            self.current = None
+        while self.blocks:
+            self.flush(self.blocks.pop(0), self.blocks[0] if self.blocks else None)
+        if unclosed is not None:
+            # copied as is, like the blocks the processors do not look into
+            self.write("".join(unclosed.raw))
+        self.md.captions = self.context.captions
+        self.md.caption_labels = self.context.labels
+
+
+def caption_stream(chunks, write, md=None):
+    """
+    Caption the HTML read from the iterable of strings ``chunks``, passing
+    the output to ``write``.
+
+    ``md`` is a Markdown instance with the caption extensions and their
+    options; the default ones are used without it. Its ``captions`` hold the
+    caption records afterwards.
+    """
+    if md is None:
+        md = markdown.Markdown(extensions=EXTENSIONS)
+    parser = CaptionHTMLParser(md, write)
+    for chunk in chunks:
+        parser.feed(chunk)
+    parser.close()
+
+
+def caption_html(html, md=None):
+    """Return the captioned version of the rendered ``html``."""
+    output = []
+    caption_stream([html], output.append, md)
+    return "".join(output)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m caption.html_caption",
+        description="Caption rendered HTML as the caption extensions would.",
+    )
+    parser.add_argument("source", nargs="?", help="HTML file (default: stdin)")
+    parser.add_argument(
+        "-x",
+        "--extension",
+        action="append",
+        dest="extensions",
+        help="caption extension to apply, can be repeated (default: all)",
+    )
+    args = parser.parse_args(argv)
+
+    md = markdown.Markdown(extensions=args.extensions or EXTENSIONS)
+    if args.source:
+        source = io.open(args.source, "r", encoding="utf-8")
+    else:
+        source = sys.stdin
+    try:
+        caption_stream(iter(lambda: source.read(1 << 16), ""), sys.stdout.write, md)
+    finally:
+        if args.source:
+            source.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
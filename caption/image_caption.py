@@ -11,14 +11,18 @@ Copyright (c) 2019-2020 Philipp Trommler
 
 SPDX-License-Identifier: GPL-3.0-or-later
 """
+import os
+from xml.etree import ElementTree
+
 from markdown import Extension
 
-from .caption import CaptionTreeprocessor
+from .caption import ID_FORMAT, CaptionTreeprocessor, get_dispatcher
 
 
 class ImageCaptionTreeProcessor(CaptionTreeprocessor):
     name = "figure"
     content_tag = "figure"
+    marker = "!["
 
     def __init__(
         self,
@@ -30,6 +34,20 @@ class ImageCaptionTreeProcessor(CaptionTreeprocessor):
         content_class=None,
         strip_title=True,
         caption_top=False,
+        number_offset=0,
+        section_level=0,
+        compact=False,
+        id_format=None,
+        deep=False,
+        image_dimensions=False,
+        image_root="",
+        image_cache=None,
+        lazy_loading=False,
+        eager_figures=1,
+        srcset_widths=(),
+        variant_cache=None,
+        gallery=False,
+        gallery_class="gallery",
     ):
         super(ImageCaptionTreeProcessor, self).__init__(
             md=md,
@@ -39,37 +57,228 @@ class ImageCaptionTreeProcessor(CaptionTreeprocessor):
             caption_class=caption_class,
             content_class=content_class,
             caption_top=caption_top,
+            number_offset=number_offset,
+            section_level=section_level,
+            compact=compact,
+            id_format=id_format,
+            deep=deep,
         )
         self.strip_title = strip_title
+        self.image_dimensions = image_dimensions
+        self.image_root = image_root
+        self.image_cache = image_cache
+        if image_dimensions and image_cache is None:
+            from .imagesize import ImageSizeCache
+
+            self.image_cache = ImageSizeCache()
+        self.lazy_loading = lazy_loading
+        self.eager_figures = eager_figures
+        self.srcset_widths = srcset_widths
+        self.variant_cache = variant_cache
+        self.gallery = gallery
+        self.gallery_class = gallery_class
 
     def matches(self, par):
-        self._a = None
-        self._img = par.find("./img")
-        if self._img is None:
-            self._a = par.find("./a")
-            if self._a is None:
-                return False
-            self._img = self._a.find("./img")
-        return self._img is not None
-
-    def get_title(self, par):
-        return self._img.get("title")
-
-    def build_content_element(self, par, caption, replace=True):
-        super(ImageCaptionTreeProcessor, self).build_content_element(par, caption, replace=replace)
-        if self._a is not None:
-            self._a.tail = "\n"
-            par.append(self._a)
+        """
+        Return the ``(a, img)`` pair of the image, ``a`` being optional.
+
+        In gallery mode, a paragraph of several images gives the list of
+        their pairs, found in a single pass over its children.
+        """
+        if self.gallery:
+            images = [
+                (child, child.find("./img")) if child.tag == "a" else (None, child)
+                for child in par
+                if child.tag == "img" or child.tag == "a"
+            ]
+            images = [(a, img) for a, img in images if img is not None]
+            if len(images) > 1:
+                return images
+            return images[0] if images else None
+        img = par.find("./img")
+        if img is not None:
+            return None, img
+        a = par.find("./a")
+        if a is None:
+            return None
+        img = a.find("./img")
+        if img is None:
+            return None
+        return a, img
+
+    def get_title(self, par, match=None):
+        return match[1].get("title")
+
+    def build_content_element(self, par, caption, number, match=None, replace=True):
+        super(ImageCaptionTreeProcessor, self).build_content_element(
+            par, caption, number, match, replace=replace
+        )
+        self.append_image(par, *match)
+
+    def append_image(self, content, a, img):
+        """Add the image, linked if ``a`` is given, to ``content``."""
+        if self.image_dimensions:
+            self.set_dimensions(img)
+        if self.srcset_widths and self.variant_cache is not None:
+            self.set_srcset(img)
+        if a is not None:
+            a.tail = self.newline
+            content.append(a)
         else:
-            self._img.tail = self._img.tail or "" + "\n"
-            par.append(self._img)
+            img.tail = img.tail or self.newline
+            content.append(img)
 
-    def build_caption_element(self, title):
-        caption = super(ImageCaptionTreeProcessor, self).build_caption_element(title)
-        if self.strip_title and title:
-            del self._img.attrib["title"]
+    def build_caption_element(self, title, number, match=None):
+        caption = super(ImageCaptionTreeProcessor, self).build_caption_element(
+            title, number, match
+        )
+        if self.strip_title and match[1].get("title"):
+            del match[1].attrib["title"]
+        return caption
+
+    def set_dimensions(self, img):
+        """Set the intrinsic ``width`` and ``height`` of a local image."""
+        if img.get("width") or img.get("height"):
+            return
+        from .imagesize import resolve_image_path
+
+        path = resolve_image_path(img.get("src"), self.image_root)
+        size = self.image_cache.get(path) if path else None
+        if size is not None:
+            img.set("width", str(size[0]))
+            img.set("height", str(size[1]))
+
+    def set_srcset(self, img):
+        """Offer the scaled variants of a local image to the browser."""
+        if img.get("srcset"):
+            return
+        from .imagesize import resolve_image_path
+
+        src = img.get("src")
+        path = resolve_image_path(src, self.image_root)
+        if path is None or not os.path.isfile(path):
+            return
+        srcset = self.variant_cache.srcset(path, src, self.srcset_widths)
+        if srcset:
+            img.set("srcset", srcset)
+
+    def gallery_title(self, par, images):
+        """
+        Move the content of ``par`` besides the images, text and inline
+        elements alike, to a new element, returned with the label split from
+        its end.
+        """
+        nodes = set(img if a is None else a for a, img in images)
+        title = ElementTree.Element("span")
+        title.text = par.text
+        last = None
+        for child in par:
+            if child in nodes:
+                text = child.tail
+            else:
+                title.append(child)
+                last = child
+                text = None
+            if not text:
+                continue
+            if last is None:
+                title.text = join_text(title.text, text)
+            else:
+                last.tail = join_text(last.tail, text)
+        title.text = (title.text or "").lstrip()
+        if last is None:
+            title.text, label = self.split_label(par, title.text.rstrip())
+        else:
+            last.tail, label = self.split_label(par, (last.tail or "").rstrip())
+        return title, label
+
+    def build_gallery_caption(self, title, number):
+        """Caption the whole gallery with the content of the ``title`` element."""
+        text = "".join(title.itertext())
+        caption = super(ImageCaptionTreeProcessor, self).build_caption_element(
+            text, number
+        )
+        if self.numbering:
+            caption[0].tail = " " + title.text
+        else:
+            caption.text = title.text
+        caption.extend(list(title))
         return caption
 
+    def caption_gallery(self, par, images, context):
+        """
+        Turn ``par`` into a figure holding a sub-figure per image, numbered
+        "3a", "3b"... The content of the paragraph besides the images, such as
+        text, links or emphasis, is the caption of the whole figure.
+        """
+        number = self.next_number(context)
+        title, label = self.gallery_title(par, images)
+        text = "".join(title.itertext())
+        super(ImageCaptionTreeProcessor, self).build_content_element(par, None, number)
+        if self.gallery_class:
+            classes = [par.get("class"), self.gallery_class]
+            par.set("class", " ".join(name for name in classes if name))
+        context.add_caption(
+            self.name, number, par, text, label, self.reference_text(number)
+        )
+        for index, (a, img) in enumerate(images):
+            sub_number = "{}{}".format(number, sub_letters(index))
+            sub_title, sub_label = self.split_label(img, img.get("title"))
+            content = ElementTree.SubElement(par, self.content_tag)
+            content.set("id", self.element_id(sub_number))
+            content.text = self.newline
+            content.tail = self.newline
+            caption = self.build_caption_element(sub_title, sub_number, (a, img))
+            # the text between the images went to the gallery caption
+            img.tail = None
+            self.append_image(content, a, img)
+            self.add_caption_to_content(content, caption)
+            context.add_caption(
+                "subfigure",
+                sub_number,
+                content,
+                sub_title,
+                sub_label,
+                self.reference_text(sub_number),
+            )
+        if text:
+            self.add_caption_to_content(par, self.build_gallery_caption(title, number))
+
+    def process(self, parent, par, following, context):
+        match = self.matches(par)
+        if not match:
+            return None
+        if isinstance(match, list):
+            self.caption_gallery(par, match, context)
+        else:
+            self.caption(par, match, context)
+        if self.lazy_loading:
+            # the first figures are likely above the fold
+            if context.numbers[self.name] > self.eager_figures:
+                for img in par.iter("img"):
+                    img.set("loading", "lazy")
+                    img.set("decoding", "async")
+        return True
+
+
+def join_text(text, more):
+    """Append ``more`` to ``text``, with no run of whitespace between them."""
+    if not text:
+        return more
+    if text[-1:].isspace():
+        more = more.lstrip()
+    return text + more
+
+
+def sub_letters(index):
+    """Letters of the sub-figure ``index``: a, b, ..., z, aa, ab..."""
+    letters = ""
+    index += 1
+    while index:
+        index, remainder = divmod(index - 1, 26)
+        letters = chr(ord("a") + remainder) + letters
+    return letters
+
 
 class ImageCaptionExtension(Extension):
     # caption Extension
@@ -90,12 +299,72 @@ class ImageCaptionExtension(Extension):
             "content_class": ["", "CSS class to add to the content element."],
             "strip_title": [True, "Remove the title from the img tag."],
             "caption_top": [False, "Put the caption at the top of the image."],
+            "number_offset": [0, "Number of figures preceding the document."],
+            "section_level": [
+                0,
+                "Number the figures within the sections of this heading level.",
+            ],
+            "compact": [False, "Leave the cosmetic whitespace out of the HTML."],
+            "id_format": [ID_FORMAT, "Format of the ids, from {name} and {number}."],
+            "deep": [False, "Also caption the images of nested elements."],
+            "image_dimensions": [
+                False,
+                "Set the width and height of the local images from their files.",
+            ],
+            "image_root": ["", "Directory the image paths are relative to."],
+            "image_cache": ["", "JSON file keeping the image dimensions."],
+            "lazy_loading": [False, "Let the browser load the images lazily."],
+            "eager_figures": [1, "Number of leading figures loaded eagerly."],
+            "srcset_widths": [
+                [],
+                "Widths of the scaled variants offered in the srcset (Pillow).",
+            ],
+            "variant_cache": ["", "Directory keeping the scaled variants."],
+            "variant_url": ["", "URL of the variant directory on the site."],
+            "gallery": [
+                False,
+                "Caption the images of a paragraph as sub-figures of one figure.",
+            ],
+            "gallery_class": ["gallery", "CSS class to add to the gallery figures."],
         }
         super(ImageCaptionExtension, self).__init__(**kwargs)
 
     def extendMarkdown(self, md):
-        md.treeprocessors.register(
-            ImageCaptionTreeProcessor(md, **self.getConfigs()),
+        md.registerExtension(self)
+        configs = self.getConfigs()
+        srcset = configs["srcset_widths"] and configs["variant_cache"]
+        if configs["image_dimensions"] or srcset:
+            # the image modules are only imported when their options are used
+            from .imagesize import ImageSizeCache, ImageSizeCacheSaver
+
+            configs["image_cache"] = ImageSizeCache(configs["image_cache"] or None)
+            md.postprocessors.register(
+                ImageSizeCacheSaver(md, configs["image_cache"]), "imagesizecache", 5
+            )
+        else:
+            configs["image_cache"] = None
+        variant_url = configs.pop("variant_url")
+        if srcset:
+            from .imagesize import ImageSizeCacheSaver
+            from .responsive import VariantCache, pillow_available
+
+            if not pillow_available():
+                raise ImportError(
+                    "srcset_widths requires Pillow to scale the images: "
+                    "pip install caption[images]"
+                )
+            configs["variant_cache"] = VariantCache(
+                configs["variant_cache"], variant_url, configs["image_cache"]
+            )
+            md.postprocessors.register(
+                ImageSizeCacheSaver(md, configs["variant_cache"]),
+                "imagevariantcache",
+                5,
+            )
+        else:
+            configs["variant_cache"] = None
+        get_dispatcher(md).register(
+            ImageCaptionTreeProcessor(md, **configs),
             "figurecaptiontreeprocessor",
             8,
         )
@@ -0,0 +1,232 @@
+"""
+caption - Manage markdown captions
+
+Intrinsic dimensions of local images, read from their file headers.
+
+https://github.com/flywire/caption
+Copyright (c) 2020-2023 flywire
+Copyright (c) 2023 sanzoghenzo
+
+SPDX-License-Identifier: GPL-3.0-or-later
+"""
+
+import io
+import json
+import os
+import re
+import struct
+import tempfile
+import threading
+from urllib.parse import unquote, urlsplit
+
+from markdown.postprocessors import Postprocessor
+
+# enough for the headers of PNG, GIF and WebP, and for the SVG root element
+HEADER_SIZE = 4096
+# JPEG frame headers can follow large EXIF blocks
+JPEG_LIMIT = 1 << 20
+
+SVG_LENGTH_RE = re.compile(r"^\s*([0-9.]+)\s*(px)?\s*$")
+SVG_ATTRIBUTE_RE = r"""\b{}\s*=\s*["']([^"']*)["']"""
+JPEG_FRAME_MARKERS = frozenset(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+
+
+def png_size(header, image_file):
+    if header[12:16] == b"IHDR":
+        return struct.unpack(">II", header[16:24])
+    return None
+
+
+def gif_size(header, image_file):
+    return struct.unpack("<HH", header[6:10])
+
+
+def webp_size(header, image_file):
+    chunk = header[12:16]
+    if chunk == b"VP8 ":
+        width, height = struct.unpack("<HH", header[26:30])
+        return width & 0x3FFF, height & 0x3FFF
+    if chunk == b"VP8L":
+        bits = struct.unpack("<I", header[21:25])[0]
+        return (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1
+    if chunk == b"VP8X":
+        width = struct.unpack("<I", header[24:27] + b"\0")[0]
+        height = struct.unpack("<I", header[27:30] + b"\0")[0]
+        return width + 1, height + 1
+    return None
+
+
+def jpeg_size(header, image_file):
+    """Walk the JPEG segments up to the frame header, seeking over the rest."""
+    image_file.seek(2)
+    while image_file.tell() < JPEG_LIMIT:
+        marker = image_file.read(2)
+        if len(marker) < 2 or marker[0:1] != b"\xff":
+            return None
+        code = marker[1]
+        if not isinstance(code, int):
+            code = ord(code)
+        if code == 0xFF:
+            image_file.seek(-1, os.SEEK_CUR)
+            continue
+        length = image_file.read(2)
+        if len(length) < 2:
+            return None
+        (length,) = struct.unpack(">H", length)
+        if code in JPEG_FRAME_MARKERS:
+            frame = image_file.read(5)
+            if len(frame) < 5:
+                return None
+            height, width = struct.unpack(">HH", frame[1:5])
+            return width, height
+        image_file.seek(length - 2, os.SEEK_CUR)
+    return None
+
+
+def svg_size(header, image_file):
+    text = header.decode("utf-8", "replace")
+    start = text.find("<svg")
+    if start < 0:
+        return None
+    tag = text[start:text.find(">", start)]
+    size = []
+    for name in ("width", "height"):
+        match = re.search(SVG_ATTRIBUTE_RE.format(name), tag)
+        length = SVG_LENGTH_RE.match(match.group(1)) if match else None
+        size.append(int(float(length.group(1))) if length else None)
+    if None in size:
+        match = re.search(SVG_ATTRIBUTE_RE.format("viewBox"), tag)
+        if match is None:
+            return None
+        box = match.group(1).replace(",", " ").split()
+        if len(box) != 4:
+            return None
+        size = [int(float(box[2])), int(float(box[3]))]
+    return tuple(size)
+
+
+def image_size(path):
+    """
+    Return the ``(width, height)`` of the PNG, JPEG, GIF, WebP or SVG image
+    at ``path``, or ``None`` if it cannot be determined.
+
+    Only the first bytes of the file are read, except for JPEG where the
+    segments before the frame header are skipped with seeks.
+    """
+    try:
+        with io.open(path, "rb") as image_file:
+            header = image_file.read(HEADER_SIZE)
+            if header.startswith(b"\x89PNG\r\n\x1a\n"):
+                reader = png_size
+            elif header[:6] in (b"GIF87a", b"GIF89a"):
+                reader = gif_size
+            elif header[:4] == b"RIFF" and header[8:12] == b"WEBP":
+                reader = webp_size
+            elif header.startswith(b"\xff\xd8"):
+                reader = jpeg_size
+            elif b"<svg" in header:
+                reader = svg_size
+            else:
+                return None
+            size = reader(header, image_file)
+    except (IOError, OSError, struct.error, ValueError):
+        return None
+    if size is None or not all(size):
+        return None
+    return tuple(int(value) for value in size)
+
+
+class ImageSizeCache(object):
+    """
+    Image dimensions keyed by path and validated by modification time and
+    size, optionally persisted to the JSON file ``path``.
+
+    The cache is safe to share between threads. Call `save` to persist it;
+    the entries saved meanwhile by other processes sharing the file are
+    kept.
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self.entries = self.load()
+        # entries probed since the last save
+        self.changed = {}
+        self.lock = threading.Lock()
+
+    def load(self):
+        """Return the entries of the cache file, if any."""
+        if not self.path or not os.path.exists(self.path):
+            return {}
+        try:
+            with io.open(self.path, "r", encoding="utf-8") as cache_file:
+                return json.load(cache_file)
+        except (IOError, OSError, ValueError):
+            return {}
+
+    def get(self, path):
+        """Return the ``(width, height)`` of the image at ``path``, or ``None``."""
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        key = os.path.abspath(path)
+        signature = [stat.st_mtime, stat.st_size]
+        entry = self.entries.get(key)
+        if entry is not None and entry[0] == signature:
+            return tuple(entry[1]) if entry[1] else None
+        size = image_size(path)
+        entry = [signature, list(size) if size else None]
+        with self.lock:
+            self.entries[key] = entry
+            self.changed[key] = entry
+        return size
+
+    def save(self):
+        """
+        Write the cache to its file, if it changed, merged with the entries
+        the file holds by now.
+        """
+        if not self.path or not self.changed:
+            return
+        with self.lock:
+            changed = self.changed
+            self.changed = {}
+        entries = self.load()
+        entries.update(changed)
+        payload = json.dumps(entries)
+        with self.lock:
+            entries.update(self.changed)
+            self.entries = entries
+        directory = os.path.dirname(os.path.abspath(self.path))
+        handle, temporary = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        with io.open(handle, "w", encoding="utf-8") as cache_file:
+            cache_file.write(payload)
+        os.replace(temporary, self.path)
+
+
+def resolve_image_path(src, root=""):
+    """
+    Return the file path of the image ``src`` below the directory ``root``,
+    or ``None`` for remote and inline images.
+    """
+    if not src:
+        return None
+    parts = urlsplit(src)
+    if parts.scheme or parts.netloc:
+        return None
+    path = unquote(parts.path)
+    if not path:
+        return None
+    return os.path.join(root or os.curdir, path.lstrip("/"))
+
+
+class ImageSizeCacheSaver(Postprocessor):
+    """Persist an image cache once the document is converted."""
+
+    def __init__(self, md, cache):
+        super(ImageSizeCacheSaver, self).__init__(md)
+        self.cache = cache
+
+    def run(self, text):
+        self.cache.save()
+        return text
@@ -0,0 +1,138 @@
+"""
+caption - Manage markdown captions
+
+Lists of the figures, tables and listings of a document, in place of
+``[LOF]``, ``[LOT]`` and ``[LOL]`` markers.
+
+https://github.com/flywire/caption
+Copyright (c) 2020-2023 flywire
+Copyright (c) 2023 sanzoghenzo
+
+SPDX-License-Identifier: GPL-3.0-or-later
+"""
+
+from xml.etree import ElementTree
+
+from markdown.extensions import Extension
+from markdown.treeprocessors import Treeprocessor
+from markdown.util import AtomicString
+
+from .caption import CaptionTreeprocessor, get_dispatcher
+
+MARKERS = {"[LOF]": "figure", "[LOT]": "table", "[LOL]": "listing"}
+
+
+class ListMarkerProcessor(CaptionTreeprocessor):
+    """
+    Note the marker paragraphs met by the caption pass on
+    ``md.caption_list_markers``, with the kind of their list.
+    """
+
+    name = "captionlist"
+
+    def __init__(self, md=None, markers=None):
+        super(ListMarkerProcessor, self).__init__(md)
+        self.markers = dict(MARKERS if markers is None else markers)
+        self.marker = tuple(self.markers)
+
+    def process(self, parent, par, following, context):
+        if len(par) or not par.text:
+            return None
+        kind = self.markers.get(par.text.strip())
+        if kind is None:
+            return None
+        context.md.caption_list_markers.append((par, kind))
+        return True
+
+
+class CaptionListTreeprocessor(Treeprocessor):
+    """
+    Replace the marker paragraphs with the lists of the captions recorded by
+    the caption pass.
+
+    Only the noted paragraphs are visited, and they are replaced in place,
+    so the tree is not walked again.
+    """
+
+    def __init__(self, md=None, list_class=""):
+        super(CaptionListTreeprocessor, self).__init__(md)
+        self.list_class = list_class
+
+    def processors(self):
+        """The caption processors by kind, for their reference text."""
+        processors = {}
+        for processor in get_dispatcher(self.md).processors:
+            processors[processor.name] = processor
+            for kind in getattr(processor, "kinds", ()):
+                processors[kind.name] = kind
+        return processors
+
+    def build_list(self, element, kind, processor):
+        element.clear()
+        element.tag = "div"
+        classes = [self.list_class, "{}-list".format(kind)]
+        element.set("class", " ".join(name for name in classes if name))
+        element.text = "\n"
+        element.tail = "\n"
+        items = ElementTree.SubElement(element, "ul")
+        items.text = "\n"
+        items.tail = "\n"
+        for record in self.md.captions:
+            if record["kind"] != kind:
+                continue
+            text = processor.reference_text(record["number"])
+            if record["title"]:
+                text = "{}: {}".format(text, record["title"])
+            item = ElementTree.SubElement(items, "li")
+            item.tail = "\n"
+            link = ElementTree.SubElement(item, "a")
+            link.set("href", "#{}".format(record["id"]))
+            link.text = AtomicString(text)
+
+    def run(self, root):
+        markers = self.md.caption_list_markers
+        self.md.caption_list_markers = []
+        if not markers:
+            return
+        processors = self.processors()
+        for element, kind in markers:
+            processor = processors.get(kind)
+            if processor is not None:
+                self.build_list(element, kind, processor)
+
+
+class CaptionListExtension(Extension):
+    # caption Extension
+
+    def __init__(self, **kwargs):
+        # Setup configs
+        self.config = {
+            "markers": [
+                dict(MARKERS),
+                "Paragraphs replaced by the list of the captions of a kind, as a "
+                "dict of the marker text and the kind.",
+            ],
+            "list_class": ["caption-list", "CSS class to add to the lists."],
+        }
+        super(CaptionListExtension, self).__init__(**kwargs)
+
+    def extendMarkdown(self, md):
+        self.md = md
+        md.registerExtension(self)
+        self.reset()
+        get_dispatcher(md).register(
+            ListMarkerProcessor(md, self.getConfig("markers")), "captionlistmarkers", 1
+        )
+        # after the caption dispatcher (8) has recorded the captions
+        md.treeprocessors.register(
+            CaptionListTreeprocessor(md, self.getConfig("list_class")),
+            "captionlisttreeprocessor",
+            7,
+        )
+
+    def reset(self):
+        self.md.caption_list_markers = []
+
+
+def makeExtension(**kwargs):
+    return CaptionListExtension(**kwargs)
@@ -0,0 +1,33 @@
+"""
+caption - Manage markdown captions
+
+JSON sidecar files holding the caption records of a document.
+
+https://github.com/flywire/caption
+Copyright (c) 2020-2023 flywire
+Copyright (c) 2023 sanzoghenzo
+
+SPDX-License-Identifier: GPL-3.0-or-later
+"""
+
+import io
+import json
+
+MANIFEST_SUFFIX = ".captions.json"
+
+
+def write_manifest(captions, path):
+    """
+    Write the caption records ``captions`` (usually ``md.captions``) to the
+    JSON file ``path``.
+    """
+    with io.open(path, "w", encoding="utf-8") as manifest_file:
+        manifest_file.write(
+            json.dumps(captions, ensure_ascii=False, separators=(",", ":"))
+        )
+
+
+def read_manifest(path):
+    """Return the caption records stored in the JSON file ``path``."""
+    with io.open(path, "r", encoding="utf-8") as manifest_file:
+        return json.load(manifest_file)
@@ -0,0 +1,110 @@
+"""
+caption - Manage markdown captions
+
+Cross-references to labelled captions, e.g. ``[@fig:architecture]``.
+
+https://github.com/flywire/caption
+Copyright (c) 2020-2023 flywire
+Copyright (c) 2023 sanzoghenzo
+
+SPDX-License-Identifier: GPL-3.0-or-later
+"""
+
+import logging
+from xml.etree import ElementTree
+
+from markdown.extensions import Extension
+from markdown.inlinepatterns import InlineProcessor
+from markdown.treeprocessors import Treeprocessor
+from markdown.util import AtomicString
+
+logger = logging.getLogger("MARKDOWN")
+
+REFERENCE_RE = r"\[@([^\]\s]+)\]"
+
+
+class ReferenceInlineProcessor(InlineProcessor):
+    """
+    Turn ``[@label]`` into a placeholder link, remembered on
+    ``md.caption_references`` for the resolution once the captions are
+    numbered.
+    """
+
+    def handleMatch(self, m, data):
+        element = ElementTree.Element("a")
+        element.text = AtomicString(m.group(0))
+        self.md.caption_references.append((element, m.group(1)))
+        return element, m.start(0), m.end(0)
+
+
+class ReferenceTreeprocessor(Treeprocessor):
+    """
+    Resolve the references against the label index of the caption pass.
+
+    Only the collected placeholders are visited, each with a dict lookup, so
+    the cost does not depend on the size of the tree.
+    """
+
+    def __init__(self, md=None, reference_class="", unresolved_class=""):
+        super(ReferenceTreeprocessor, self).__init__(md)
+        self.reference_class = reference_class
+        self.unresolved_class = unresolved_class
+
+    def run(self, root):
+        labels = getattr(self.md, "caption_labels", {})
+        unresolved = []
+        for element, label in self.md.caption_references:
+            target = labels.get(label)
+            if target is None:
+                element.tag = "span"
+                if self.unresolved_class:
+                    element.set("class", self.unresolved_class)
+                unresolved.append(label)
+                continue
+            element.set("href", "#{}".format(target["id"]))
+            if self.reference_class:
+                element.set("class", self.reference_class)
+            element.text = AtomicString(target["text"])
+        self.md.caption_references = []
+        self.md.caption_unresolved = unresolved
+        if unresolved:
+            logger.warning(
+                "Unresolved caption references: %s", ", ".join(sorted(set(unresolved)))
+            )
+
+
+class CrossReferenceExtension(Extension):
+    # caption Extension
+
+    def __init__(self, **kwargs):
+        # Setup configs
+        self.config = {
+            "reference_class": ["", "CSS class to add to the reference links."],
+            "unresolved_class": [
+                "unresolved",
+                "CSS class to add to the unresolved references.",
+            ],
+        }
+        super(CrossReferenceExtension, self).__init__(**kwargs)
+
+    def extendMarkdown(self, md):
+        self.md = md
+        md.registerExtension(self)
+        self.reset()
+        md.inlinePatterns.register(
+            ReferenceInlineProcessor(REFERENCE_RE, md), "captionreference", 175
+        )
+        # after the caption dispatcher (8) has built the label index
+        md.treeprocessors.register(
+            ReferenceTreeprocessor(md, **self.getConfigs()),
+            "captionreferencetreeprocessor",
+            7,
+        )
+
+    def reset(self):
+        self.md.caption_references = []
+        self.md.caption_unresolved = []
+
+
+def makeExtension(**kwargs):
+    return CrossReferenceExtension(**kwargs)
@@ -0,0 +1,154 @@
+"""
+caption - Manage markdown captions
+
+Pre-scaled variants of local images for the ``srcset`` of figures.
+
+https://github.com/flywire/caption
+Copyright (c) 2020-2023 flywire
+Copyright (c) 2023 sanzoghenzo
+
+SPDX-License-Identifier: GPL-3.0-or-later
+"""
+
+import hashlib
+import io
+import json
+import os
+import tempfile
+import threading
+from importlib.util import find_spec
+
+from .imagesize import ImageSizeCache
+
+INDEX_NAME = "index.json"
+DIGEST_SIZE = 16
+
+
+def pillow_available():
+    """Whether Pillow, which scales the variants, is installed."""
+    return find_spec("PIL") is not None
+
+
+def file_digest(path):
+    digest = hashlib.sha256()
+    with io.open(path, "rb") as image_file:
+        for block in iter(lambda: image_file.read(1 << 16), b""):
+            digest.update(block)
+    return digest.hexdigest()[:DIGEST_SIZE]
+
+
+class VariantCache(object):
+    """
+    Scaled copies of images stored in ``directory`` under the digest of the
+    original content and their width, and served from the URL prefix ``url``.
+
+    Variants are only created when missing, so they are shared by identical
+    images and reused from build to build. The digests of the originals are
+    kept in an index checked against their modification time and size, so an
+    unchanged image is not read again either; like `ImageSizeCache`, the
+    index is merged with its file when saved. Scaling requires Pillow.
+    """
+
+    def __init__(self, directory, url="", sizes=None):
+        self.directory = directory
+        self.url = url
+        self.sizes = sizes if sizes is not None else ImageSizeCache()
+        self.index_path = os.path.join(directory, INDEX_NAME)
+        self.index = self.load()
+        # entries computed since the last save
+        self.changed = {}
+        self.lock = threading.Lock()
+
+    def load(self):
+        """Return the entries of the index file, if any."""
+        if not os.path.exists(self.index_path):
+            return {}
+        try:
+            with io.open(self.index_path, "r", encoding="utf-8") as index_file:
+                return json.load(index_file)
+        except (IOError, OSError, ValueError):
+            return {}
+
+    def digest(self, path):
+        stat = os.stat(path)
+        key = os.path.abspath(path)
+        signature = [stat.st_mtime, stat.st_size]
+        entry = self.index.get(key)
+        if entry is not None and entry[0] == signature:
+            return entry[1]
+        digest = file_digest(path)
+        entry = [signature, digest]
+        with self.lock:
+            self.index[key] = entry
+            self.changed[key] = entry
+        return digest
+
+    def variant(self, path, width):
+        """Return the file name of the ``width`` pixels wide copy of ``path``."""
+        extension = os.path.splitext(path)[1].lower()
+        name = "{}-{}w{}".format(self.digest(path), width, extension)
+        target = os.path.join(self.directory, name)
+        if not os.path.exists(target):
+            if not os.path.isdir(self.directory):
+                os.makedirs(self.directory)
+            self.scale(path, target, width)
+        return name
+
+    def scale(self, path, target, width):
+        """Write to ``target`` the image ``path`` scaled to ``width`` pixels."""
+        from PIL import Image
+
+        extension = os.path.splitext(target)[1]
+        handle, temporary = tempfile.mkstemp(dir=self.directory, suffix=extension)
+        os.close(handle)
+        try:
+            with Image.open(path) as image:
+                height = max(1, int(round(image.height * width / float(image.width))))
+                image.resize((width, height), Image.LANCZOS).save(temporary)
+            os.replace(temporary, target)
+        except BaseException:
+            os.remove(temporary)
+            raise
+
+    def srcset(self, path, src, widths):
+        """
+        Return the ``srcset`` of the image ``path`` served as ``src``, or
+        ``None`` if it has no size or no variant narrower than itself.
+        """
+        if path.lower().endswith(".svg"):
+            return None
+        size = self.sizes.get(path)
+        if size is None:
+            return None
+        candidates = [
+            "{}{} {}w".format(self.url, self.variant(path, width), width)
+            for width in sorted(set(widths))
+            if width < size[0]
+        ]
+        if not candidates:
+            return None
+        candidates.append("{} {}w".format(src, size[0]))
+        return ", ".join(candidates)
+
+    def save(self):
+        """
+        Write the index of the digests, if it changed, merged with the
+        entries the file holds by now.
+        """
+        if not self.changed:
+            return
+        with self.lock:
+            changed = self.changed
+            self.changed = {}
+        if not os.path.isdir(self.directory):
+            os.makedirs(self.directory)
+        index = self.load()
+        index.update(changed)
+        payload = json.dumps(index)
+        with self.lock:
+            index.update(self.changed)
+            self.index = index
+        handle, temporary = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        with io.open(handle, "w", encoding="utf-8") as index_file:
+            index_file.write(payload)
+        os.replace(temporary, self.index_path)
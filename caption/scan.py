@@ -0,0 +1,122 @@
+"""
+caption - Manage markdown captions
+
+Cheap scan of markdown sources for captionable content, without rendering.
+
+https://github.com/flywire/caption
+Copyright (c) 2020-2023 flywire
+Copyright (c) 2023 sanzoghenzo
+
+SPDX-License-Identifier: GPL-3.0-or-later
+"""
+
+import re
+
+from .caption import PrefixMatcher
+
+KINDS = ("figure", "table", "listing")
+LISTING_PREFIXES = {"Listing: ": "listing"}
+
+FENCE_RE = re.compile(r"^ {0,3}(`{3,}|~{3,})")
+SKIPPED_BLOCK_RE = re.compile(r"^(?: {4}|\t| {0,3}(?:[#><]|[*+-]\s|\d+[.)]\s))")
+UNDERLINE_RE = re.compile(r"^ {0,3}(?:=+|-+)\s*$")
+TABLE_SEPARATOR_CHARS = set("|:- ")
+
+
+def iter_blocks(source):
+    """
+    Yield the blank-line separated blocks of ``source`` as lists of lines.
+
+    Fenced code blocks are skipped whole, as parsed by the ``fenced_code``
+    extension.
+    """
+    block = []
+    fence = None
+    for line in source.splitlines():
+        if fence:
+            if line.strip().startswith(fence):
+                fence = None
+            continue
+        match = FENCE_RE.match(line)
+        if match:
+            if block:
+                yield block
+                block = []
+            fence = match.group(1)
+            continue
+        if line.strip():
+            block.append(line)
+        elif block:
+            yield block
+            block = []
+    if block:
+        yield block
+
+
+def is_paragraph(block):
+    """Whether ``block`` would be parsed as a top level paragraph."""
+    if SKIPPED_BLOCK_RE.match(block[0]):
+        return False
+    return len(block) < 2 or not UNDERLINE_RE.match(block[1])
+
+
+def is_table(block):
+    """Whether ``block`` looks like a table of the ``tables`` extension."""
+    if len(block) < 2 or "-" not in block[1] or "|" not in block[0] + block[1]:
+        return False
+    return set(block[1]) <= TABLE_SEPARATOR_CHARS
+
+
+def count_captions(source, prefixes=None):
+    """
+    Count the figures, tables and listings the caption extensions will number
+    in the markdown ``source``.
+
+    ``prefixes`` maps the paragraph prefixes of the listing kinds to their
+    names, "Listing: " by default; the kinds declared with the ``kinds``
+    option are counted by passing their prefixes too.
+
+    The source is only split into blocks, which makes this much cheaper than
+    a conversion but approximate for unusual documents, e.g. image syntax in
+    inline code. Returns a dict with a count for each kind in `KINDS` and
+    each kind of ``prefixes``.
+    """
+    prefixes = LISTING_PREFIXES if prefixes is None else prefixes
+    matcher = PrefixMatcher(prefixes)
+    counts = dict.fromkeys(KINDS, 0)
+    counts.update(dict.fromkeys(prefixes.values(), 0))
+    caption_pending = False
+    for block in iter_blocks(source):
+        if caption_pending and is_table(block):
+            counts["table"] += 1
+        caption_pending = False
+        if not is_paragraph(block):
+            continue
+        first = block[0]
+        kind = matcher.match(first)
+        if first.startswith("Table: "):
+            caption_pending = True
+        elif kind is not None:
+            counts[kind] += 1
+        elif any("![" in line for line in block):
+            counts["figure"] += 1
+    return counts
+
+
+def number_offsets(sources, prefixes=None):
+    """
+    Return, for each of the ``sources`` in order, the number of captions of
+    each kind found in the sources before it, ``prefixes`` being those of
+    `count_captions`.
+
+    The values are suitable for the ``number_offset`` option of the matching
+    extensions, so that the sources can be rendered independently with
+    continuous numbering.
+    """
+    offsets = []
+    totals = dict.fromkeys(KINDS, 0)
+    for source in sources:
+        offsets.append(dict(totals))
+        for kind, count in count_captions(source, prefixes).items():
+            totals[kind] = totals.get(kind, 0) + count
+    return offsets
@@ -0,0 +1,170 @@
+"""
+caption - Manage markdown captions
+
+Continuous caption numbering across the pages of a site.
+
+https://github.com/flywire/caption
+Copyright (c) 2020-2023 flywire
+Copyright (c) 2023 sanzoghenzo
+
+SPDX-License-Identifier: GPL-3.0-or-later
+"""
+
+import hashlib
+import io
+import json
+import os
+
+from .caption import get_dispatcher
+from .scan import KINDS, count_captions
+
+KIND_EXTENSIONS = {
+    "figure": "caption.image_caption",
+    "table": "caption.table_caption",
+    "listing": "caption.caption",
+}
+
+
+def source_hash(source):
+    return hashlib.sha256(source.encode("utf-8")).hexdigest()
+
+
+def count_records(captions):
+    """Count the caption records of a page (``md.captions``) by kind."""
+    counts = dict.fromkeys(KINDS, 0)
+    for caption in captions:
+        counts[caption["kind"]] = counts.get(caption["kind"], 0) + 1
+    return counts
+
+
+def set_number_offsets(md, offsets):
+    """Set the ``number_offset`` of the caption processors of ``md``."""
+    for processor in get_dispatcher(md).processors:
+        processor.number_offset = offsets.get(processor.name, 0)
+        for kind in getattr(processor, "kinds", ()):
+            kind.number_offset = offsets.get(kind.name, 0)
+
+
+def caption_prefixes(md):
+    """
+    Map the paragraph prefixes of the listing kinds of ``md``, e.g. the
+    ones declared with ``kinds``, to their names.
+    """
+    prefixes = {}
+    for processor in get_dispatcher(md).processors:
+        for kind in getattr(processor, "kinds", [processor]):
+            prefix = getattr(kind, "prefix", None)
+            if prefix:
+                prefixes[prefix] = kind.name
+    return prefixes
+
+
+def offset_configs(offsets):
+    """Return the ``extension_configs`` applying ``offsets``."""
+    return {
+        extension: {"number_offset": offsets.get(kind, 0)}
+        for kind, extension in KIND_EXTENSIONS.items()
+    }
+
+
+class SiteNumbering(object):
+    """
+    Per-kind caption counters continued from page to page in navigation
+    order.
+
+    The counts of every page are persisted in the JSON file ``state_path``
+    with the hash of its source, so a new build only scans the pages that
+    changed. Pages are then rendered independently, in parallel if wanted,
+    with the offsets returned by `plan`; only the `modified` and `changed`
+    ones differ from the previous build. `update` corrects the counts with
+    the captions actually rendered and returns the few pages to render again,
+    if any.
+
+    ``prefixes`` maps the paragraph prefixes of the listing kinds to their
+    names, see `caption_prefixes`.
+    """
+
+    def __init__(self, state_path=None, prefixes=None):
+        self.state_path = state_path
+        self.prefixes = prefixes
+        self.pages = {}
+        self.config = ""
+        self.order = []
+        self.offsets = {}
+        self.previous = {}
+        self.edited = set()
+        if state_path and os.path.exists(state_path):
+            with io.open(state_path, "r", encoding="utf-8") as state_file:
+                state = json.load(state_file)
+            self.pages = state["pages"]
+            self.config = state.get("config", "")
+            self.previous = {
+                name: page.get("offsets") for name, page in self.pages.items()
+            }
+
+    def compute_offsets(self):
+        totals = dict.fromkeys(KINDS, 0)
+        self.offsets = {}
+        for name in self.order:
+            self.offsets[name] = dict(totals)
+            for kind, count in self.pages[name]["counts"].items():
+                totals[kind] = totals.get(kind, 0) + count
+        return self.offsets
+
+    def plan(self, pages, config=""):
+        """
+        Compute the offsets of ``pages``, a list of ``(name, source)`` pairs
+        in navigation order, and return them as ``{name: {kind: offset}}``.
+
+        Only the pages whose source changed since the saved state are
+        scanned, unless ``config``, a digest of the options of the
+        conversion, changed too.
+        """
+        self.order = []
+        known = self.pages if config == self.config else {}
+        self.config = config
+        self.pages = {}
+        self.edited = set()
+        for name, source in pages:
+            digest = source_hash(source)
+            page = known.get(name)
+            if page is None or page["hash"] != digest:
+                page = {"hash": digest, "counts": count_captions(source, self.prefixes)}
+                self.edited.add(name)
+            self.pages[name] = page
+            self.order.append(name)
+        return self.compute_offsets()
+
+    def modified(self):
+        """Names of the pages new or edited since the previous build."""
+        return [name for name in self.order if name in self.edited]
+
+    def changed(self):
+        """Names of the pages whose offsets differ from the previous build."""
+        return [
+            name for name in self.order if self.previous.get(name) != self.offsets[name]
+        ]
+
+    def update(self, counts):
+        """
+        Correct the counts of the rendered pages, given as ``{name: counts}``
+        (see `count_records`).
+
+        Returns the names of the pages whose offsets moved as a result: only
+        those must be rendered again, and that fix-up can be parallel too.
+        """
+        planned = self.offsets
+        for name, page_counts in counts.items():
+            self.pages[name]["counts"] = dict(page_counts)
+        offsets = self.compute_offsets()
+        return [name for name in self.order if planned.get(name) != offsets[name]]
+
+    def save(self):
+        """Persist the counts and offsets of the pages."""
+        for name in self.order:
+            self.pages[name]["offsets"] = self.offsets[name]
+        state = {"pages": self.pages, "config": self.config}
+        with io.open(self.state_path, "w", encoding="utf-8") as state_file:
+            state_file.write(json.dumps(state, sort_keys=True))
+        self.previous = dict(self.offsets)
+        self.edited = set()
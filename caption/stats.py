@@ -0,0 +1,122 @@
+"""
+caption - Manage markdown captions
+
+Opt-in instrumentation of the caption processors.
+
+https://github.com/flywire/caption
+Copyright (c) 2020-2023 flywire
+Copyright (c) 2023 sanzoghenzo
+
+SPDX-License-Identifier: GPL-3.0-or-later
+"""
+
+import time
+
+from .caption import dispatch, get_dispatcher
+
+
+class ProcessorStats(object):
+    """Counters of one caption processor over one document."""
+
+    def __init__(self, name):
+        self.name = name
+        self.scanned = 0
+        self.matches = 0
+        self.captions = 0
+        self.seconds = 0.0
+
+    def as_dict(self):
+        return {
+            "scanned": self.scanned,
+            "matches": self.matches,
+            "captions": self.captions,
+            "seconds": self.seconds,
+        }
+
+
+class CaptionStats(object):
+    """
+    Counters of a caption run over one document.
+
+    ``processors`` maps the name of each processor to its `ProcessorStats`:
+    the elements it was offered (``scanned``), the elements it handled
+    (``matches``), the captions it built and the time spent in it.
+    ``seconds`` is the wall time of the whole run.
+    """
+
+    def __init__(self):
+        self.processors = {}
+        self.seconds = 0.0
+
+    def add(self, name):
+        return self.processors.setdefault(name, ProcessorStats(name))
+
+    @property
+    def captions(self):
+        return sum(stats.captions for stats in self.processors.values())
+
+    def as_dict(self):
+        return {
+            "seconds": self.seconds,
+            "processors": {
+                name: stats.as_dict() for name, stats in self.processors.items()
+            },
+        }
+
+
+class TimedProcessor(object):
+    """Wrap a caption processor to update its `ProcessorStats`."""
+
+    def __init__(self, processor, stats):
+        self.processor = processor
+        self.stats = stats
+
+    def __getattr__(self, name):
+        return getattr(self.processor, name)
+
+    def process(self, parent, par, following, context):
+        stats = self.stats
+        stats.scanned += 1
+        captions = len(context.captions)
+        started = time.perf_counter()
+        keep = self.processor.process(parent, par, following, context)
+        stats.seconds += time.perf_counter() - started
+        if keep is not None:
+            stats.matches += 1
+        stats.captions += len(context.captions) - captions
+        return keep
+
+
+def enable_stats(md, hook=None):
+    """
+    Instrument the caption processors of ``md``.
+
+    After each conversion ``md.caption_stats`` holds the `CaptionStats` of
+    the document, which is also passed to ``hook`` if given. Without this,
+    the processors run uninstrumented.
+    """
+    dispatcher = get_dispatcher(md)
+
+    def instrument(root, processors, context):
+        stats = CaptionStats()
+        for processor in dispatcher.processors:
+            stats.add(processor.name)
+        started = time.perf_counter()
+        if processors:
+            dispatch(
+                root,
+                [TimedProcessor(p, stats.add(p.name)) for p in processors],
+                context,
+            )
+        stats.seconds = time.perf_counter() - started
+        md.caption_stats = stats
+        if hook is not None:
+            hook(stats)
+
+    dispatcher.instrument = instrument
+    md.caption_stats = None
+
+
+def disable_stats(md):
+    """Stop instrumenting the caption processors of ``md``."""
+    get_dispatcher(md).instrument = None
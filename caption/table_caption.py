@@ -10,40 +10,50 @@ from xml.etree import ElementTree
 
 from markdown import Extension
 
-from .caption import CaptionTreeprocessor
+from .caption import ID_FORMAT, CaptionTreeprocessor, get_dispatcher
 
 
 class TableCaptionTreeProcessor(CaptionTreeprocessor):
     name = "table"
     content_tag = "table"
     caption_tag = "caption"
+    marker = "Table: "
+
+    def __init__(self, md=None, bottom_class="caption-bottom", **kwargs):
+        super(TableCaptionTreeProcessor, self).__init__(md, **kwargs)
+        self.bottom_class = bottom_class
 
     def matches(self, par):
         return par.text and par.text.startswith("Table: ")
 
-    def get_title(self, par):
+    def get_title(self, par, match=None):
         return par.text[7:]
 
     def add_caption_to_content(self, content, caption):
         if not self.caption_top:
-            caption.set("style", "caption-side:bottom")
+            if self.compact and self.bottom_class:
+                classes = [caption.get("class"), self.bottom_class]
+                caption.set("class", " ".join(name for name in classes if name))
+            else:
+                caption.set("style", "caption-side:bottom")
         content.insert(0, caption)
 
-    def run(self, root):
-        """Find and format all captions."""
-        root_iterator = iter(root)
-        for child in root_iterator:
-            if child.tag != "p" or not self.matches(child):
-                continue
-            next_item = next(root_iterator)
-            if next_item.tag != self.content_tag:
-                continue
-            self.number += 1
-            title = self.get_title(child)
-            root.remove(child)
-            caption = self.build_caption_element(title)
-            self.build_content_element(next_item, caption, replace=False)
-            self.add_caption_to_content(next_item, caption)
+    def process(self, parent, par, following, context):
+        """Caption the table following ``par``, which is then dropped."""
+        match = self.matches(par)
+        if not match:
+            return None
+        if following is None or following.tag != self.content_tag:
+            return None
+        number = self.next_number(context)
+        title, label = self.split_label(par, self.get_title(par, match))
+        caption = self.build_caption_element(title, number, match)
+        self.build_content_element(following, caption, number, match, replace=False)
+        self.add_caption_to_content(following, caption)
+        context.add_caption(
+            self.name, number, following, title, label, self.reference_text(number)
+        )
+        return False
 
 
 class TableCaptionExtension(Extension):
@@ -64,11 +74,28 @@ class TableCaptionExtension(Extension):
             "caption_class": ["", "CSS class to add to the caption element."],
             "content_class": ["", "CSS class to add to the content element."],
             "caption_top": [True, "Put the caption at the top of the table."],
+            "number_offset": [0, "Number of tables preceding the document."],
+            "section_level": [
+                0,
+                "Number the tables within the sections of this heading level.",
+            ],
+            "compact": [
+                False,
+                "Leave the cosmetic whitespace out of the HTML and place bottom "
+                "captions with bottom_class instead of an inline style.",
+            ],
+            "bottom_class": [
+                "caption-bottom",
+                "CSS class of the bottom captions in compact mode.",
+            ],
+            "id_format": [ID_FORMAT, "Format of the ids, from {name} and {number}."],
+            "deep": [False, "Also caption the tables of nested elements."],
         }
         super(TableCaptionExtension, self).__init__(**kwargs)
 
     def extendMarkdown(self, md):
-        md.treeprocessors.register(
+        md.registerExtension(self)
+        get_dispatcher(md).register(
             TableCaptionTreeProcessor(md, **self.getConfigs()),
             "tablecaptiontreeprocessor",
             8,
@@ -24,10 +24,12 @@ setuptools.setup(
         "License :: OSI Approved :: GNU General Public License v3 or later (GPLv3+)",
         "Operating System :: OS Independent",
         "Programming Language :: Python",
-        "Programming Language :: Python :: 2",
-        "Programming Language :: Python :: 2.7",
         "Programming Language :: Python :: 3",
-        "Programming Language :: Python :: 3.6",
+        "Programming Language :: Python :: 3 :: Only",
+        "Programming Language :: Python :: 3.7",
+        "Programming Language :: Python :: 3.8",
+        "Programming Language :: Python :: 3.9",
+        "Programming Language :: Python :: 3.10",
         "Programming Language :: Python :: Implementation :: CPython",
         "Topic :: Documentation",
         "Topic :: Text Processing :: Markup",
@@ -35,11 +37,14 @@ setuptools.setup(
     description="Manage markdown captions extension",
     entry_points={
         "markdown.extensions": [
-            "caption = caption:CaptionExtension",
-            "image_captions = caption:ImageCaptionExtension",
-            "table_captions = caption:TableCaptionExtension",
+            "caption = caption.caption:CaptionExtension",
+            "image_captions = caption.image_caption:ImageCaptionExtension",
+            "table_captions = caption.table_caption:TableCaptionExtension",
+            "caption_references = caption.reference:CrossReferenceExtension",
+            "caption_lists = caption.lists:CaptionListExtension",
         ]
     },
+    extras_require={"images": ["Pillow"]},
     install_requires=requirements,
     keywords="markdown image figure caption html a11y",
     license="GPLv3+",
@@ -49,7 +54,7 @@ setuptools.setup(
     maintainer_email="flywire0@gmail.com",
     name="caption",
     packages=setuptools.find_packages(),
-    python_requires=">=2.7.15, >=3, <4",
+    python_requires=">=3.7, <4",
     url="https://github.com/flywire/caption",
     version="0.2.3",
 )
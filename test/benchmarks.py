@@ -0,0 +1,465 @@
+# caption - Manage markdown captions
+#
+# Copyright (c) 2020-2023 flywire
+# Copyright (c) 2023 sanzoghenzo
+# forked from yafg - https://git.sr.ht/~ferruck/yafg
+# Copyright (c) 2019 Philipp Trommler
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+"""
+Benchmarks for the caption processors.
+
+Run with ``python -m test.benchmarks`` from the repository root; ``--help``
+lists the options.
+"""
+import argparse
+import math
+import os
+import subprocess
+import sys
+import time
+import tracemalloc
+
+import markdown
+
+from caption import CaptionExtension, ImageCaptionExtension, TableCaptionExtension
+from caption.stats import enable_stats
+
+DEFAULT_SIZES = (100, 1000, 10000)
+SUPERLINEAR_SLOPE = 1.25
+# seconds allowed to import an extension module once markdown is loaded
+IMPORT_BUDGET = 0.05
+ENTRY_POINTS = (
+    "caption.image_caption",
+    "caption.table_caption",
+    "caption.caption",
+    "caption.reference",
+    "caption.lists",
+)
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+IMPORT_SCRIPT = """\
+import sys, time
+{preload}
+started = time.perf_counter()
+import {module}
+print(time.perf_counter() - started)
+print(" ".join(sorted(
+    name for name in sys.modules if name.split(".")[0] in ("caption", "markdown")
+)))
+"""
+
+PROSE = """\
+Lorem ipsum dolor sit amet, *consectetur* adipiscing elit, sed do eiusmod
+tempor incididunt ut labore et dolore magna aliqua, see [the docs](/docs/)."""
+
+FIGURE = '![Figure {0} alt text](/images/figure-{0}.png "Figure {0} title")'
+
+TABLE = """\
+Table: Table {0} title
+
+| Name | Value |
+| ---- | ----- |
+| a{0} | {0}   |
+| b{0} | {0}   |"""
+
+LISTING = "Listing: Listing {0} title"
+
+SCENARIOS = {
+    "baseline": lambda: ["tables"],
+    "image": lambda: ["tables", ImageCaptionExtension()],
+    "table": lambda: ["tables", TableCaptionExtension()],
+    "listing": lambda: ["tables", CaptionExtension()],
+    "all": lambda: [
+        "tables",
+        ImageCaptionExtension(),
+        TableCaptionExtension(),
+        CaptionExtension(),
+    ],
+}
+
+
+def generate_document(figures=0, tables=0, listings=0, prose=1):
+    """
+    Build a markdown document with the given number of captionable elements.
+
+    The elements are interleaved and each one is followed by ``prose``
+    paragraphs of plain text.
+    """
+    blocks = []
+    kinds = [(FIGURE, figures), (TABLE, tables), (LISTING, listings)]
+    for index in range(max(figures, tables, listings)):
+        for template, count in kinds:
+            if index < count:
+                blocks.append(template.format(index + 1))
+                blocks.extend([PROSE] * prose)
+    return "\n\n".join(blocks) + "\n"
+
+
+def measure(source, extensions, repeat=3):
+    """
+    Convert ``source`` and return the best wall time and the peak memory.
+
+    ``extensions`` is a callable returning a fresh extension list, so that
+    every conversion starts from a new Markdown instance.
+    """
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        markdown.markdown(source, extensions=extensions())
+        best = min(best, time.perf_counter() - started)
+    tracemalloc.start()
+    try:
+        markdown.markdown(source, extensions=extensions())
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return best, peak
+
+
+def measure_reuse(source, extensions, pages=1000):
+    """
+    Convert ``source`` ``pages`` times, building a new Markdown instance per
+    page and then reusing a single instance with ``reset()``.
+
+    Returns the total wall time of both strategies.
+    """
+    started = time.perf_counter()
+    for _ in range(pages):
+        markdown.Markdown(extensions=extensions()).convert(source)
+    fresh = time.perf_counter() - started
+    md = markdown.Markdown(extensions=extensions())
+    started = time.perf_counter()
+    for _ in range(pages):
+        md.reset().convert(source)
+    reused = time.perf_counter() - started
+    return fresh, reused
+
+
+def measure_plain(paragraphs=200, pages=50):
+    """
+    Convert ``pages`` caption-free pages of ``paragraphs`` paragraphs with
+    no caption extension and with all of them.
+
+    Returns the total wall time of both.
+    """
+    source = "\n\n".join([PROSE] * paragraphs)
+    timings = []
+    for name in ("baseline", "all"):
+        md = markdown.Markdown(extensions=SCENARIOS[name]())
+        started = time.perf_counter()
+        for _ in range(pages):
+            md.reset().convert(source)
+        timings.append(time.perf_counter() - started)
+    return tuple(timings)
+
+
+def measure_kinds(kind_counts=(1, 10, 100), paragraphs=2000, repeat=3):
+    """
+    Convert a document mixing prose and "Listing: " paragraphs with
+    `CaptionExtension` declaring an increasing number of caption kinds.
+
+    Returns ``{kind_count: seconds}``; flat timings mean the per-element
+    cost does not depend on the number of kinds.
+    """
+    source = "\n\n".join(
+        LISTING.format(index) if index % 2 else PROSE for index in range(paragraphs)
+    )
+    timings = {}
+    for count in kind_counts:
+        kinds = [
+            {"name": "kind{}".format(index), "prefix": "Kind {}: ".format(index)}
+            for index in range(count)
+        ]
+        md = markdown.Markdown(extensions=[CaptionExtension(kinds=kinds)])
+        best = float("inf")
+        for _ in range(repeat):
+            started = time.perf_counter()
+            md.reset().convert(source)
+            best = min(best, time.perf_counter() - started)
+        timings[count] = best
+    return timings
+
+
+def measure_size(size=1000, prose=1):
+    """
+    Convert a document of ``size`` figures, tables and listings with all the
+    caption extensions in default and in compact mode, with short ids.
+
+    Returns the byte sizes of the HTML of both.
+    """
+    source = generate_document(size, size, size, prose=prose)
+    sizes = []
+    for compact in (False, True):
+        options = {"compact": True, "id_format": "{name}{number}"} if compact else {}
+        extensions = [
+            "tables",
+            ImageCaptionExtension(**options),
+            TableCaptionExtension(caption_top=False, **options),
+            CaptionExtension(**options),
+        ]
+        html = markdown.markdown(source, extensions=extensions)
+        sizes.append(len(html.encode("utf-8")))
+    return tuple(sizes)
+
+
+def generate_nested(count, depth, prose=1):
+    """
+    Build a markdown document with ``count`` figures, tables and listings,
+    each nested in ``depth`` blockquotes and followed by ``prose`` top level
+    paragraphs.
+    """
+    prefix = "> " * depth
+    blocks = []
+    for index in range(count):
+        for template in (FIGURE, TABLE, LISTING):
+            lines = template.format(index + 1).splitlines()
+            blocks.append("\n".join((prefix + line).rstrip() for line in lines))
+            blocks.extend([PROSE] * max(prose, 1))
+    return "\n\n".join(blocks) + "\n"
+
+
+def measure_deep(sizes=DEFAULT_SIZES, depth=10, repeat=3):
+    """
+    Time the caption pass alone, in deep mode, on documents of growing
+    ``sizes`` with every element nested ``depth`` levels deep.
+
+    Returns ``{size: (seconds, captions)}``.
+    """
+    results = {}
+    for size in sizes:
+        source = generate_nested(size, depth)
+        md = markdown.Markdown(
+            extensions=[
+                "tables",
+                ImageCaptionExtension(deep=True),
+                TableCaptionExtension(deep=True),
+                CaptionExtension(deep=True),
+            ]
+        )
+        enable_stats(md)
+        best = float("inf")
+        for _ in range(repeat):
+            md.reset().convert(source)
+            best = min(best, md.caption_stats.seconds)
+        results[size] = (best, md.caption_stats.captions)
+    return results
+
+
+def measure_import(module, preload="markdown", repeat=5):
+    """
+    Import ``module`` in fresh interpreters, after ``preload`` if given.
+
+    Returns the best import time and the ``caption`` and ``markdown``
+    modules loaded in the end.
+    """
+    script = IMPORT_SCRIPT.format(
+        preload="import {}".format(preload) if preload else "", module=module
+    )
+    best = float("inf")
+    for _ in range(repeat):
+        output = subprocess.check_output(
+            [sys.executable, "-c", script], cwd=ROOT, universal_newlines=True
+        )
+        seconds, modules = output.splitlines()
+        best = min(best, float(seconds))
+    return best, set(modules.split())
+
+
+def scaling_slope(sizes, seconds):
+    """Least-squares slope of log(time) over log(size); 1.0 is linear."""
+    xs = [math.log(size) for size in sizes]
+    ys = [math.log(max(value, 1e-9)) for value in seconds]
+    mean_x = sum(xs) / len(xs)
+    mean_y = sum(ys) / len(ys)
+    num = sum((x - mean_x) * (y - mean_y) for x, y in zip(xs, ys))
+    den = sum((x - mean_x) ** 2 for x in xs)
+    return num / den if den else 0.0
+
+
+def run_suite(sizes=DEFAULT_SIZES, scenarios=None, repeat=3, prose=1):
+    """
+    Measure every scenario at every size.
+
+    Returns a list of result dicts, one per scenario and size, with the
+    per-element overhead computed against the ``baseline`` scenario.
+    """
+    names = list(scenarios or SCENARIOS)
+    if "baseline" not in names:
+        names.insert(0, "baseline")
+    for name in names:
+        # warm up imports and regex caches before the first timing
+        markdown.markdown(generate_document(1, 1, 1), extensions=SCENARIOS[name]())
+    results = []
+    for size in sizes:
+        source = generate_document(size, size, size, prose=prose)
+        elements = 3 * size
+        baseline = None
+        for name in names:
+            seconds, peak = measure(source, SCENARIOS[name], repeat=repeat)
+            if name == "baseline":
+                baseline = seconds
+            results.append(
+                {
+                    "scenario": name,
+                    "size": size,
+                    "elements": elements,
+                    "seconds": seconds,
+                    "peak_bytes": peak,
+                    "overhead_us": (seconds - baseline) / elements * 1e6,
+                }
+            )
+    return results
+
+
+def superlinear(results, threshold=SUPERLINEAR_SLOPE):
+    """Return ``{scenario: slope}`` for the scenarios scaling worse than linear."""
+    flagged = {}
+    for name in {result["scenario"] for result in results}:
+        rows = [result for result in results if result["scenario"] == name]
+        if len(rows) < 2:
+            continue
+        slope = scaling_slope(
+            [row["elements"] for row in rows], [row["seconds"] for row in rows]
+        )
+        if slope > threshold:
+            flagged[name] = slope
+    return flagged
+
+
+def format_results(results):
+    lines = [
+        "{:<10} {:>7} {:>10} {:>14} {:>12}".format(
+            "scenario", "size", "time (s)", "overhead (us)", "peak (KiB)"
+        )
+    ]
+    for result in results:
+        lines.append(
+            "{:<10} {:>7} {:>10.4f} {:>14.2f} {:>12.1f}".format(
+                result["scenario"],
+                result["size"],
+                result["seconds"],
+                result["overhead_us"],
+                result["peak_bytes"] / 1024.0,
+            )
+        )
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "--sizes",
+        type=int,
+        nargs="+",
+        default=list(DEFAULT_SIZES),
+        help="number of figures, tables and listings per document",
+    )
+    parser.add_argument(
+        "--scenario", action="append", choices=sorted(SCENARIOS), dest="scenarios"
+    )
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument(
+        "--prose", type=int, default=1, help="prose paragraphs after each element"
+    )
+    parser.add_argument("--threshold", type=float, default=SUPERLINEAR_SLOPE)
+    parser.add_argument(
+        "--reuse",
+        type=int,
+        metavar="PAGES",
+        help="compare fresh and reset Markdown instances over PAGES small pages",
+    )
+    parser.add_argument(
+        "--plain",
+        type=int,
+        metavar="PARAGRAPHS",
+        help="measure the overhead on caption-free pages of PARAGRAPHS paragraphs",
+    )
+    parser.add_argument(
+        "--kinds",
+        type=int,
+        nargs="+",
+        metavar="COUNT",
+        help="measure CaptionExtension with COUNT declared caption kinds",
+    )
+    parser.add_argument(
+        "--html-size",
+        type=int,
+        metavar="SIZE",
+        help="compare the HTML size of the default and compact modes on a "
+        "document of SIZE figures, tables and listings",
+    )
+    parser.add_argument(
+        "--deep",
+        type=int,
+        metavar="DEPTH",
+        help="time the deep caption pass on elements nested DEPTH levels deep",
+    )
+    parser.add_argument(
+        "--imports",
+        action="store_true",
+        help="measure the import time of the extension modules",
+    )
+    args = parser.parse_args(argv)
+
+    if args.deep:
+        results = measure_deep(args.sizes, args.deep, args.repeat)
+        for size, (seconds, captions) in sorted(results.items()):
+            print("{:>7} captions: {:.4f} s".format(captions, seconds))
+        slope = scaling_slope(
+            sorted(results), [results[size][0] for size in sorted(results)]
+        )
+        if slope > args.threshold:
+            print("SUPERLINEAR: deep pass scales with slope {:.2f}".format(slope))
+            return 1
+        return 0
+    if args.imports:
+        over = False
+        for module in ("caption",) + ENTRY_POINTS:
+            seconds, _ = measure_import(module)
+            over = over or seconds > IMPORT_BUDGET
+            print("{:<24} {:>8.1f} ms".format(module, seconds * 1000))
+        return 1 if over else 0
+    if args.html_size:
+        default, compact = measure_size(args.html_size, args.prose)
+        print("default: {:.1f} KiB".format(default / 1024.0))
+        print(
+            "compact: {:.1f} KiB ({:+.1f}%)".format(
+                compact / 1024.0, (compact / float(default) - 1) * 100
+            )
+        )
+        return 0
+    if args.kinds:
+        for count, seconds in sorted(measure_kinds(args.kinds).items()):
+            print("{:>6} kinds: {:.4f} s".format(count, seconds))
+        return 0
+    if args.plain:
+        baseline, captions = measure_plain(args.plain)
+        print("without caption extensions: {:.4f} s".format(baseline))
+        print(
+            "with caption extensions:    {:.4f} s ({:+.1f}%)".format(
+                captions, (captions / baseline - 1) * 100
+            )
+        )
+        return 0
+    if args.reuse:
+        source = generate_document(2, 1, 1)
+        fresh, reused = measure_reuse(source, SCENARIOS["all"], args.reuse)
+        print("fresh instance per page: {:.4f} s".format(fresh))
+        print(
+            "reused instance:         {:.4f} s ({:.1f}x faster)".format(
+                reused, fresh / reused
+            )
+        )
+        return 0
+
+    results = run_suite(args.sizes, args.scenarios, args.repeat, args.prose)
+    print(format_results(results))
+    flagged = superlinear(results, args.threshold)
+    for name, slope in sorted(flagged.items()):
+        print("SUPERLINEAR: {} scales with slope {:.2f}".format(name, slope))
+    return 1 if flagged else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,157 @@
+# caption - Manage markdown captions
+#
+# Copyright (c) 2020-2023 flywire
+# Copyright (c) 2023 sanzoghenzo
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+import asyncio
+
+import markdown
+import pytest
+from markdown.preprocessors import Preprocessor
+
+from caption import CaptionExtension, ImageCaptionExtension, TableCaptionExtension
+from caption.aio import DEFAULT_EXTENSIONS, AsyncRenderer
+from caption.cache import cache_key
+
+SOURCE = """\
+![alt](/a.png "Title {#fig:a}")
+
+Table: Values
+
+| a |
+|---|
+| 1 |
+
+Listing: Code"""
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+def test_convert():
+    async def main():
+        async with AsyncRenderer(size=2) as renderer:
+            return await renderer.render(SOURCE)
+
+    entry = run(main())
+    assert entry["html"] == markdown.markdown(SOURCE, extensions=DEFAULT_EXTENSIONS)
+    assert [caption["kind"] for caption in entry["attributes"]["captions"]] == [
+        "figure",
+        "table",
+        "listing",
+    ]
+    assert entry["attributes"]["caption_labels"]["fig:a"]["number"] == 1
+
+
+def test_concurrent():
+    sources = ["{}\n\n![alt](/{}.png \"Title\")".format(SOURCE, i) for i in range(20)]
+
+    async def main():
+        async with AsyncRenderer(size=3) as renderer:
+            return await asyncio.gather(*(renderer.convert(s) for s in sources))
+
+    expected = [markdown.markdown(s, extensions=DEFAULT_EXTENSIONS) for s in sources]
+    assert run(main()) == expected
+
+
+def test_cache():
+    async def main():
+        async with AsyncRenderer(size=2, cache_size=2) as renderer:
+            first = await renderer.convert(SOURCE)
+            assert await renderer.convert(SOURCE) == first
+            assert (renderer.hits, renderer.misses) == (1, 1)
+            # a different salt, then an eviction of the least recently used
+            await renderer.convert(SOURCE, salt="other")
+            await renderer.convert(SOURCE)
+            await renderer.convert("Listing: Other")
+            assert (renderer.hits, renderer.misses) == (2, 3)
+            await renderer.convert(SOURCE, salt="other")
+            assert renderer.misses == 4
+
+            # identical requests in flight share a conversion
+            renderer.clear()
+            await asyncio.gather(*(renderer.convert(SOURCE) for _ in range(5)))
+            assert renderer.misses == 5
+
+    run(main())
+
+
+def test_cache_key_config():
+    async def main():
+        plain = AsyncRenderer(size=1, extensions=[ImageCaptionExtension()])
+        other = AsyncRenderer(
+            size=1, extensions=[ImageCaptionExtension(caption_prefix="Fig.")]
+        )
+        try:
+            assert plain.key(SOURCE) != other.key(SOURCE)
+            assert "Fig.&nbsp;1" in await other.convert(SOURCE)
+        finally:
+            plain.close()
+            other.close()
+
+    run(main())
+
+
+def test_key_config_computed_once(monkeypatch):
+    async def main():
+        async with AsyncRenderer(size=1) as renderer:
+            expected = cache_key(renderer.instances[0], SOURCE)
+            # the configuration is not hashed again per request
+            monkeypatch.setattr("caption.cache.extension_configs", pytest.fail)
+            assert renderer.key(SOURCE) == expected
+            assert renderer.key(SOURCE, salt="x") != expected
+            assert await renderer.convert(SOURCE) == await renderer.convert(SOURCE)
+            assert renderer.hits == 1
+
+    run(main())
+
+
+def test_error():
+    class Failing(CaptionExtension):
+        def extendMarkdown(self, md):
+            super(Failing, self).extendMarkdown(md)
+            md.preprocessors.register(Raising(md), "raising", 100)
+
+    class Raising(Preprocessor):
+        def run(self, lines):
+            raise ValueError("boom")
+
+    async def main():
+        async with AsyncRenderer(size=1, extensions=[Failing()]) as renderer:
+            with pytest.raises(ValueError):
+                await renderer.convert(SOURCE)
+            assert renderer.pending == {}
+            assert renderer.pool.qsize() == 1
+
+    run(main())
+
+
+def test_cancel_first_request():
+    async def main():
+        async with AsyncRenderer(size=1) as renderer:
+            first = asyncio.ensure_future(renderer.convert(SOURCE))
+            second = asyncio.ensure_future(renderer.convert(SOURCE))
+            await asyncio.sleep(0)
+            first.cancel()
+            html = await second
+            assert first.cancelled()
+            assert (renderer.hits, renderer.misses) == (1, 1)
+            # the result of the conversion is kept
+            assert await renderer.convert(SOURCE) == html
+            assert renderer.misses == 1
+            assert renderer.pending == {}
+            return html
+
+    assert run(main()) == markdown.markdown(SOURCE, extensions=DEFAULT_EXTENSIONS)
+
+
+def test_extensions():
+    async def main():
+        async with AsyncRenderer(
+            size=1, extensions=["tables", TableCaptionExtension()]
+        ) as renderer:
+            return await renderer.convert(SOURCE)
+
+    assert '<table id="_table-1">' in run(main())
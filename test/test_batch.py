@@ -0,0 +1,76 @@
+# caption - Manage markdown captions
+#
+# Copyright (c) 2020-2023 flywire
+# Copyright (c) 2023 sanzoghenzo
+# forked from yafg - https://git.sr.ht/~ferruck/yafg
+# Copyright (c) 2019 Philipp Trommler
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+import json
+
+from caption.batch import convert_tree, find_sources, main
+from caption.manifest import read_manifest
+
+
+def write_sources(tmp_path, count=6):
+    source = tmp_path / "docs"
+    for index in range(count):
+        page = source / "section{}".format(index % 2) / "page{}.md".format(index)
+        page.parent.mkdir(parents=True, exist_ok=True)
+        page.write_text(
+            '![alt](/img.png "Title {0}")\n\n![alt](/img2.png "Other")\n\n'
+            "Table: Table {0}\n\n| a | b |\n| - | - |\n| 1 | 2 |\n".format(index)
+        )
+    (source / "notes.txt").write_text("not markdown")
+    return source
+
+
+def test_find_sources(tmp_path):
+    source = write_sources(tmp_path, count=2)
+    assert find_sources(str(source)) == ["section0/page0.md", "section1/page1.md"]
+
+
+def test_convert_tree(tmp_path):
+    source = write_sources(tmp_path)
+    destination = tmp_path / "site"
+    result = convert_tree(str(source), str(destination), jobs=1)
+    assert result.files == 6
+    html = (destination / "section1" / "page3.html").read_text()
+    assert '<figure id="_figure-2">' in html
+    assert "<span>Table&nbsp;1:</span> Table 3" in html
+    assert not (destination / "notes.html").exists()
+
+
+def test_process_pool(tmp_path):
+    source = write_sources(tmp_path, count=10)
+    serial = convert_tree(str(source), str(tmp_path / "serial"), jobs=1)
+    parallel = convert_tree(str(source), str(tmp_path / "parallel"), jobs=3)
+    assert parallel.files == serial.files == 10
+    assert parallel.output_bytes == serial.output_bytes
+    for index in range(10):
+        path = "section{}/page{}.html".format(index % 2, index)
+        assert (tmp_path / "serial" / path).read_text() == (
+            tmp_path / "parallel" / path
+        ).read_text()
+
+
+def test_main(tmp_path, capsys):
+    source = write_sources(tmp_path, count=2)
+    config = tmp_path / "config.json"
+    config.write_text(json.dumps({"caption.image_caption": {"caption_prefix": "Fig."}}))
+    assert main([str(source), str(tmp_path / "site"), "-q", "-c", str(config)]) == 0
+    assert "2 files" in capsys.readouterr().out
+    html = (tmp_path / "site" / "section0" / "page0.html").read_text()
+    assert "<span>Fig.&nbsp;1:</span>" in html
+
+
+def test_manifest(tmp_path):
+    source = write_sources(tmp_path, count=1)
+    destination = tmp_path / "site"
+    convert_tree(str(source), str(destination), jobs=1, manifest=True)
+    captions = read_manifest(str(destination / "section0" / "page0.captions.json"))
+    assert [(caption["id"], caption["title"]) for caption in captions] == [
+        ("_figure-1", "Title 0"),
+        ("_figure-2", "Other"),
+        ("_table-1", "Table 0"),
+    ]
@@ -0,0 +1,118 @@
+# caption - Manage markdown captions
+#
+# Copyright (c) 2020-2023 flywire
+# Copyright (c) 2023 sanzoghenzo
+# forked from yafg - https://git.sr.ht/~ferruck/yafg
+# Copyright (c) 2019 Philipp Trommler
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+import markdown
+
+from caption import CaptionExtension, ImageCaptionExtension, TableCaptionExtension
+
+from .benchmarks import (
+    ENTRY_POINTS,
+    SCENARIOS,
+    generate_document,
+    generate_nested,
+    measure_deep,
+    measure_import,
+    measure_kinds,
+    measure_plain,
+    measure_reuse,
+    measure_size,
+    run_suite,
+    scaling_slope,
+    superlinear,
+)
+
+
+def test_generate_document():
+    source = generate_document(figures=3, tables=2, listings=1, prose=2)
+    out_string = markdown.markdown(
+        source,
+        extensions=[
+            "tables",
+            ImageCaptionExtension(),
+            TableCaptionExtension(),
+            CaptionExtension(),
+        ],
+    )
+    assert out_string.count("<figure ") == 3
+    assert out_string.count("<table ") == 2
+    assert out_string.count("<div class=listing ") == 1
+    assert 'id="_figure-3"' in out_string
+
+
+def test_scaling_slope():
+    sizes = [10, 100, 1000]
+    assert abs(scaling_slope(sizes, [0.1, 1.0, 10.0]) - 1.0) < 1e-9
+    assert abs(scaling_slope(sizes, [0.1, 10.0, 1000.0]) - 2.0) < 1e-9
+
+
+def test_superlinear():
+    results = [
+        {"scenario": "linear", "elements": 10, "seconds": 0.1},
+        {"scenario": "linear", "elements": 100, "seconds": 1.0},
+        {"scenario": "quadratic", "elements": 10, "seconds": 0.1},
+        {"scenario": "quadratic", "elements": 100, "seconds": 10.0},
+    ]
+    assert list(superlinear(results)) == ["quadratic"]
+
+
+def test_run_suite():
+    results = run_suite(sizes=[5, 10], scenarios=["all"], repeat=1)
+    assert [(r["scenario"], r["size"]) for r in results] == [
+        ("baseline", 5),
+        ("all", 5),
+        ("baseline", 10),
+        ("all", 10),
+    ]
+    assert all(r["peak_bytes"] > 0 for r in results)
+
+
+def test_measure_reuse():
+    fresh, reused = measure_reuse(generate_document(1, 1, 1), SCENARIOS["all"], 3)
+    assert fresh > 0 and reused > 0
+
+
+def test_measure_plain():
+    baseline, captions = measure_plain(paragraphs=5, pages=2)
+    assert baseline > 0 and captions > 0
+
+
+def test_measure_kinds():
+    timings = measure_kinds(kind_counts=(1, 5), paragraphs=10, repeat=1)
+    assert sorted(timings) == [1, 5]
+
+
+def test_measure_size():
+    default, compact = measure_size(size=10, prose=0)
+    assert compact < default
+
+
+def test_import_package():
+    _, modules = measure_import("caption", preload=None, repeat=1)
+    assert modules == {"caption"}
+
+
+def test_import_entry_points():
+    for module in ENTRY_POINTS:
+        _, modules = measure_import(module, repeat=1)
+        caption_modules = {name for name in modules if name.startswith("caption")}
+        assert caption_modules <= {"caption", "caption.caption", module}, module
+
+
+def test_generate_nested():
+    source = generate_nested(2, depth=3)
+    out_string = markdown.markdown(
+        source, extensions=["tables", ImageCaptionExtension(deep=True)]
+    )
+    assert out_string.count("<blockquote>") == 18
+    assert '<figure id="_figure-2">' in out_string
+
+
+def test_measure_deep():
+    results = measure_deep(sizes=[5, 10], depth=4, repeat=1)
+    assert results[5][1] == 15
+    assert results[10][1] == 30
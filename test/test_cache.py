@@ -0,0 +1,97 @@
+# caption - Manage markdown captions
+#
+# Copyright (c) 2020-2023 flywire
+# Copyright (c) 2023 sanzoghenzo
+# forked from yafg - https://git.sr.ht/~ferruck/yafg
+# Copyright (c) 2019 Philipp Trommler
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+import os
+
+import markdown
+
+from caption import CaptionExtension, ImageCaptionExtension
+from caption.batch import convert_tree
+from caption.cache import ConversionCache, cache_key
+
+SOURCE = '![alt](/a.png "Title")\n\nListing: Code'
+
+
+def make_md(**image_options):
+    return markdown.Markdown(
+        extensions=["toc", ImageCaptionExtension(**image_options), CaptionExtension()]
+    )
+
+
+def test_cache_key():
+    md = make_md()
+    assert cache_key(md, SOURCE) == cache_key(make_md(), SOURCE)
+    assert cache_key(md, SOURCE) != cache_key(md, SOURCE + " ")
+    assert cache_key(md, SOURCE) != cache_key(md, SOURCE, salt="page.md")
+    assert cache_key(md, SOURCE) != cache_key(make_md(caption_prefix="Fig."), SOURCE)
+    assert cache_key(md, SOURCE) != cache_key(make_md(caption_top=True), SOURCE)
+
+
+def test_cache_key_unregistered_extension():
+    # nl2br adds an inline pattern without registering itself
+    md = make_md()
+    other = markdown.Markdown(
+        extensions=[
+            "toc",
+            "nl2br",
+            ImageCaptionExtension(),
+            CaptionExtension(),
+        ]
+    )
+    assert md.convert("a\nb") != other.convert("a\nb")
+    assert cache_key(md, SOURCE) != cache_key(other, SOURCE)
+    assert cache_key(md, SOURCE) == cache_key(md.reset(), SOURCE)
+
+
+def test_hit(tmp_path):
+    cache = ConversionCache(str(tmp_path))
+    md = make_md()
+    html = cache.convert(md, SOURCE)
+    captions = md.captions
+    assert (cache.hits, cache.misses) == (0, 1)
+
+    other = make_md()
+    assert cache.convert(other, SOURCE) == html
+    assert other.captions == captions
+    assert other.toc_tokens == []
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_invalidation(tmp_path):
+    cache = ConversionCache(str(tmp_path))
+    cache.convert(make_md(), SOURCE)
+    html = cache.convert(make_md(caption_prefix="Fig."), SOURCE)
+    assert "Fig.&nbsp;1" in html
+    assert (cache.hits, cache.misses) == (0, 2)
+    cache.clear()
+    cache.convert(make_md(), SOURCE)
+    assert cache.misses == 3
+
+
+def test_batch_cache(tmp_path):
+    source = tmp_path / "docs"
+    source.mkdir()
+    (source / "page.md").write_text(SOURCE)
+    cache = str(tmp_path / "cache")
+    convert_tree(str(source), str(tmp_path / "first"), jobs=1, cache=cache)
+    convert_tree(str(source), str(tmp_path / "second"), jobs=1, cache=cache)
+    assert len(list((tmp_path / "cache").iterdir())) == 1
+    assert (tmp_path / "second" / "page.html").read_text() == (
+        tmp_path / "first" / "page.html"
+    ).read_text()
+
+
+def test_image_files_not_cached(tmp_path):
+    image = tmp_path / "a.png"
+    image.write_bytes(b"")
+    cache = ConversionCache(str(tmp_path / "cache"))
+    md = make_md(image_dimensions=True, image_root=str(tmp_path))
+    cache.convert(md, SOURCE)
+    cache.convert(md, SOURCE)
+    assert (cache.hits, cache.misses) == (0, 0)
+    assert os.listdir(str(tmp_path / "cache")) == []
@@ -0,0 +1,390 @@
+# caption - Manage markdown captions
+#
+# Copyright (c) 2020-2023 flywire
+# Copyright (c) 2023 sanzoghenzo
+# forked from yafg - https://git.sr.ht/~ferruck/yafg
+# Copyright (c) 2019 Philipp Trommler
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+import re
+from concurrent.futures import ThreadPoolExecutor
+from xml.etree import ElementTree
+
+import markdown
+from markdown.preprocessors import Preprocessor
+
+import caption.caption as caption_module
+from caption import CaptionExtension, ImageCaptionExtension, TableCaptionExtension
+from caption.caption import (
+    DISPATCHER_NAME,
+    CaptionContext,
+    CaptionDispatcher,
+    ListingCaptionTreeProcessor,
+    dispatch,
+    get_dispatcher,
+)
+from caption.image_caption import ImageCaptionTreeProcessor
+from caption.manifest import read_manifest, write_manifest
+from caption.table_caption import TableCaptionTreeProcessor
+
+
+MIXED_MD = """\
+![alt text](/path/to/image.png "Title")
+
+Table: Table title
+
+| Syntax      | Description |
+| ----------- | ----------- |
+| Header      | Title       |
+
+Listing: Listing title
+
+![alt text 2](/path/to/image2.png "Title 2")"""
+
+
+def all_extensions():
+    return ["tables", ImageCaptionExtension(), TableCaptionExtension(), CaptionExtension()]
+
+
+def test_single_dispatcher():
+    md = markdown.Markdown(extensions=all_extensions())
+    dispatcher = md.treeprocessors[DISPATCHER_NAME]
+    assert isinstance(dispatcher, CaptionDispatcher)
+    assert len(dispatcher.processors) == 3
+    assert sum(isinstance(p, CaptionDispatcher) for p in md.treeprocessors) == 1
+
+
+def test_mixed_content():
+    expected_string = """\
+<figure id="_figure-1">
+<img alt="alt text" src="/path/to/image.png" />
+<figcaption><span>Figure&nbsp;1:</span> Title</figcaption>
+</figure>
+<table id="_table-1">
+<caption><span>Table&nbsp;1:</span> Table title</caption>
+<thead>
+<tr>
+<th>Syntax</th>
+<th>Description</th>
+</tr>
+</thead>
+<tbody>
+<tr>
+<td>Header</td>
+<td>Title</td>
+</tr>
+</tbody>
+</table>
+<div class=listing id="_listing-1">
+<figcaption><span>Listing&nbsp;1:</span> Listing title</figcaption>
+</div class=listing>
+<figure id="_figure-2">
+<img alt="alt text 2" src="/path/to/image2.png" />
+<figcaption><span>Figure&nbsp;2:</span> Title 2</figcaption>
+</figure>"""
+    out_string = markdown.markdown(MIXED_MD, extensions=all_extensions())
+    assert out_string == expected_string
+
+
+def test_processor_run_standalone():
+    md = markdown.Markdown()
+    root = md.parser.parseDocument(MIXED_MD.split("\n")).getroot()
+    md.treeprocessors["inline"].run(root)
+    ImageCaptionTreeProcessor(md, caption_prefix="Figure").run(root)
+    assert [child.get("id") for child in root.findall("./figure")] == [
+        "_figure-1",
+        "_figure-2",
+    ]
+
+
+def test_reset_restarts_numbering():
+    md = markdown.Markdown(extensions=all_extensions())
+    first = md.convert(MIXED_MD)
+    second = md.reset().convert(MIXED_MD)
+    assert second == first
+    assert 'id="_figure-3"' not in second
+
+
+def test_numbering_per_conversion():
+    md = markdown.Markdown(extensions=all_extensions())
+    assert md.convert(MIXED_MD) == md.convert(MIXED_MD)
+
+
+def test_concurrent_conversion():
+    shared = [
+        ImageCaptionTreeProcessor(caption_prefix="Figure"),
+        TableCaptionTreeProcessor(caption_prefix="Table"),
+        ListingCaptionTreeProcessor(caption_prefix="Listing"),
+    ]
+
+    def convert(figures):
+        # Markdown instances are not thread safe, the processors are shared
+        md = markdown.Markdown(extensions=["tables"])
+        dispatcher = get_dispatcher(md)
+        for priority, processor in enumerate(shared):
+            dispatcher.register(processor, processor.name, priority)
+        source = "\n\n".join(
+            '![alt](/img{0}.png "Figure {0}")\n\nListing: Listing {0}'.format(index)
+            for index in range(figures)
+        )
+        return figures, md.convert(source)
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        results = list(executor.map(convert, [index % 25 + 1 for index in range(400)]))
+    for figures, out_string in results:
+        assert re.findall(r'<figure id="_figure-(\d+)">', out_string) == [
+            str(index + 1) for index in range(figures)
+        ]
+        assert re.findall(r"Listing&nbsp;(\d+):", out_string) == [
+            str(index + 1) for index in range(figures)
+        ]
+
+
+def test_captions_records():
+    md = markdown.Markdown(extensions=all_extensions())
+    assert md.captions == []
+    md.convert(MIXED_MD)
+    assert md.captions == [
+        {"kind": "figure", "number": 1, "id": "_figure-1", "title": "Title", "label": None},
+        {"kind": "table", "number": 1, "id": "_table-1", "title": "Table title", "label": None},
+        {"kind": "listing", "number": 1, "id": "_listing-1", "title": "Listing title", "label": None},
+        {"kind": "figure", "number": 2, "id": "_figure-2", "title": "Title 2", "label": None},
+    ]
+    md.reset()
+    assert md.captions == []
+
+
+def test_manifest_round_trip(tmp_path):
+    md = markdown.Markdown(extensions=all_extensions())
+    md.convert(MIXED_MD)
+    path = str(tmp_path / "page.captions.json")
+    write_manifest(md.captions, path)
+    assert read_manifest(path) == md.captions
+
+
+def test_skip_without_markers(monkeypatch):
+    calls = []
+    monkeypatch.setattr(
+        caption_module, "dispatch", lambda root, processors, context: calls.append(
+            [processor.name for processor in processors]
+        )
+    )
+    md = markdown.Markdown(extensions=all_extensions())
+    md.convert("Nothing to caption here.\n\n* not even\n* in lists")
+    assert calls == []
+    md.reset().convert("Listing: Only a listing")
+    assert calls == [["listing"]]
+
+
+def test_skip_keeps_output():
+    in_string = "Plain text.\n\nTable: Not followed by a table"
+    md = markdown.Markdown(extensions=all_extensions())
+    assert md.convert(in_string) == markdown.markdown(in_string, extensions=["tables"])
+    assert md.captions == []
+
+
+class SnippetPreprocessor(Preprocessor):
+    def run(self, lines):
+        snippet = '![a](/a.png "A")'
+        return [snippet if line == "--8<-- a" else line for line in lines]
+
+
+def test_scan_after_content_preprocessors():
+    md = markdown.Markdown(extensions=all_extensions())
+    md.preprocessors.register(SnippetPreprocessor(md), "snippets", 32)
+    out_string = md.convert("Some text.\n\n--8<-- a")
+    assert '<figure id="_figure-1">' in out_string
+    assert [caption["kind"] for caption in md.captions] == ["figure"]
+
+
+def test_section_numbering():
+    in_string = """\
+# Introduction
+
+![first](/a.png "First")
+
+## Details
+
+Table: Values
+
+| a |
+|---|
+| 1 |
+
+# Usage
+
+![second](/b.png "Second")
+
+Listing: Code
+
+![third](/c.png "Third {#fig:third}")
+
+See [@fig:third]."""
+    md = markdown.Markdown(
+        extensions=[
+            "tables",
+            ImageCaptionExtension(section_level=1),
+            TableCaptionExtension(section_level=1),
+            CaptionExtension(section_level=1),
+            "caption.reference",
+        ]
+    )
+    out_string = md.convert(in_string)
+    assert '<figure id="_figure-1-1">' in out_string
+    assert '<table id="_table-1-1">' in out_string
+    assert '<figure id="_figure-2-1">' in out_string
+    assert 'id="_listing-2-1"' in out_string
+    assert '<figure id="_figure-2-2">' in out_string
+    assert "<span>Figure&nbsp;2.2:</span> Third" in out_string
+    assert '<a href="#_figure-2-2">Figure&nbsp;2.2</a>' in out_string
+    assert [caption["number"] for caption in md.captions] == [
+        "1.1",
+        "1.1",
+        "2.1",
+        "2.1",
+        "2.2",
+    ]
+
+
+def test_section_numbering_level():
+    in_string = """\
+# Title
+
+![first](/a.png "First")
+
+## One
+
+![second](/b.png "Second")
+
+## Two
+
+![third](/c.png "Third")
+
+# Appendix
+
+## One
+
+![fourth](/d.png "Fourth")"""
+    md = markdown.Markdown(extensions=[ImageCaptionExtension(section_level=2)])
+    md.convert(in_string)
+    assert [caption["number"] for caption in md.captions] == [
+        1,
+        "1.1.1",
+        "1.2.1",
+        "2.1.1",
+    ]
+    assert [caption["id"] for caption in md.captions] == [
+        "_figure-1",
+        "_figure-1-1-1",
+        "_figure-1-2-1",
+        "_figure-2-1-1",
+    ]
+
+
+def test_section_numbering_distinct():
+    in_string = """\
+# A
+
+## One
+
+![a](/a.png "A {#fig:a}")
+
+# B
+
+## One
+
+![b](/b.png "B {#fig:b}")
+
+See [@fig:a] and [@fig:b]."""
+    md = markdown.Markdown(
+        extensions=[ImageCaptionExtension(section_level=2), "caption.reference"]
+    )
+    out_string = md.convert(in_string)
+    assert [caption["id"] for caption in md.captions] == [
+        "_figure-1-1-1",
+        "_figure-2-1-1",
+    ]
+    assert '<a href="#_figure-1-1-1">Figure&nbsp;1.1.1</a>' in out_string
+    assert '<a href="#_figure-2-1-1">Figure&nbsp;2.1.1</a>' in out_string
+    # without a heading of the upper level
+    md.reset().convert("## One\n\n![a](/a.png)\n\n## Two\n\n![b](/b.png)")
+    assert [caption["number"] for caption in md.captions] == ["1.1", "2.1"]
+
+
+DEEP_MD = """\
+![alt](/1.png "Top")
+
+* item
+
+    ![alt](/2.png "In list")
+
+> Table: Quoted
+>
+> | a |
+> |---|
+> | 1 |
+
+!!! note "Note"
+    Listing: In admonition
+
+    > ![alt](/3.png "Deeper")
+
+![alt](/4.png "Top again")"""
+
+
+def test_deep():
+    md = markdown.Markdown(
+        extensions=[
+            "tables",
+            "admonition",
+            ImageCaptionExtension(deep=True),
+            TableCaptionExtension(deep=True),
+            CaptionExtension(deep=True),
+        ]
+    )
+    out_string = md.convert(DEEP_MD)
+    assert [(c["kind"], c["number"], c["title"]) for c in md.captions] == [
+        ("figure", 1, "Top"),
+        ("figure", 2, "In list"),
+        ("table", 1, "Quoted"),
+        ("listing", 1, "In admonition"),
+        ("figure", 3, "Deeper"),
+        ("figure", 4, "Top again"),
+    ]
+    assert "Table: " not in out_string
+    assert "<blockquote>\n<table" in out_string
+
+
+def test_deep_opt_in():
+    md = markdown.Markdown(
+        extensions=[
+            "tables",
+            "admonition",
+            ImageCaptionExtension(deep=True),
+            TableCaptionExtension(),
+            CaptionExtension(),
+        ]
+    )
+    out_string = md.convert(DEEP_MD)
+    assert [(c["kind"], c["number"]) for c in md.captions] == [
+        ("figure", 1),
+        ("figure", 2),
+        ("figure", 3),
+        ("figure", 4),
+    ]
+    assert "<p>Table: Quoted</p>" in out_string
+    assert "<p>Listing: In admonition</p>" in out_string
+
+
+def test_deep_nesting():
+    # far deeper than the recursion limit
+    root = ElementTree.Element("div")
+    parent = root
+    for _ in range(5000):
+        parent = ElementTree.SubElement(parent, "blockquote")
+    par = ElementTree.SubElement(parent, "p")
+    par.text = "Listing: Deep"
+    context = CaptionContext()
+    dispatch(root, [ListingCaptionTreeProcessor(deep=True)], context)
+    assert par.get("id") == "_listing-1"
+    assert len(context.captions) == 1
@@ -0,0 +1,161 @@
+# caption - Manage markdown captions
+#
+# Copyright (c) 2020-2023 flywire
+# Copyright (c) 2023 sanzoghenzo
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+import markdown
+
+from caption import CaptionExtension, ImageCaptionExtension, TableCaptionExtension
+from caption.html_caption import caption_html, caption_stream
+
+BASE_EXTENSIONS = ["tables", "attr_list", "fenced_code"]
+
+SOURCE = """\
+# Introduction
+
+Some *text* & more &copy; here <b>raw</b>.
+
+![alt & text](/a.png?x=1&y=2 "Title &amp; <more>")
+
+[![linked](/b.png "Linked")](https://example.com/?a=1&b=2)
+
+Table: The table
+
+| a | b |
+|---|---|
+| 1 | 2 |
+
+Table: no table follows
+
+Listing: Code listing
+
+```python
+x = 1 < 2
+```
+
+<div>
+<p>Listing: inside raw HTML</p>
+</div>
+
+# Usage
+
+![last](/c.png "Last"){: .wide #last }
+
+* list ![x](/x.png "X")
+
+Listing: At the end"""
+
+
+def caption_extensions(code_blocks=False, **options):
+    return [
+        ImageCaptionExtension(**options),
+        TableCaptionExtension(**options),
+        CaptionExtension(code_blocks=code_blocks, **options),
+    ]
+
+
+def check_identical(**options):
+    expected = markdown.markdown(
+        SOURCE, extensions=BASE_EXTENSIONS + caption_extensions(**options)
+    )
+    rendered = markdown.markdown(SOURCE, extensions=BASE_EXTENSIONS)
+    md = markdown.Markdown(extensions=caption_extensions(**options))
+    assert caption_html(rendered, md) == expected
+    return md
+
+
+def test_identical():
+    md = check_identical()
+    assert [caption["kind"] for caption in md.captions] == [
+        "figure",
+        "figure",
+        "table",
+        "listing",
+        "figure",
+        "listing",
+    ]
+
+
+def test_identical_with_options():
+    check_identical(caption_top=True, numbering=False, caption_class="caption")
+    check_identical(section_level=1, id_format="{name}{number}")
+    check_identical(compact=True)
+    check_identical(code_blocks=True)
+    check_identical(code_blocks=True, caption_top=True, compact=True)
+
+
+def test_highlighted_code_blocks():
+    source = "Listing: Indented\n\n    x = 1\n\nListing: Fenced\n\n```\ny = 2\n```"
+    extensions = ["fenced_code", "codehilite"]
+    expected = markdown.markdown(
+        source, extensions=extensions + [CaptionExtension(code_blocks=True)]
+    )
+    assert expected.count('<figure class="listing"') == 2
+    rendered = markdown.markdown(source, extensions=extensions)
+    md = markdown.Markdown(extensions=[CaptionExtension(code_blocks=True)])
+    assert caption_html(rendered, md) == expected
+
+
+def test_default_extensions():
+    rendered = markdown.markdown(SOURCE, extensions=BASE_EXTENSIONS)
+    expected = markdown.markdown(
+        SOURCE, extensions=BASE_EXTENSIONS + caption_extensions()
+    )
+    assert caption_html(rendered) == expected
+
+
+def test_stream():
+    rendered = markdown.markdown(SOURCE, extensions=BASE_EXTENSIONS)
+    output = []
+    # chunks splitting tags, entities and blocks anywhere
+    caption_stream(
+        (rendered[index:index + 7] for index in range(0, len(rendered), 7)),
+        output.append,
+    )
+    assert "".join(output) == caption_html(rendered)
+
+
+def test_passthrough():
+    html = '<!DOCTYPE html>\n<div class="x">&nbsp;<p>Table: T</p></div>\n<hr>\n<p>Text'
+    assert caption_html(html) == html
+
+
+DEEP_SOURCE = """\
+![top](/1.png "Top")
+
+> ![quoted](/2.png "Quoted")
+>
+> Table: In quote
+>
+> | a |
+> |---|
+> | 1 |
+
+* item
+
+    ![listed](/3.png "In list")
+
+* other
+
+![last](/4.png "Last")"""
+
+
+def test_deep():
+    expected = markdown.markdown(
+        DEEP_SOURCE, extensions=BASE_EXTENSIONS + caption_extensions(deep=True)
+    )
+    rendered = markdown.markdown(DEEP_SOURCE, extensions=BASE_EXTENSIONS)
+    md = markdown.Markdown(extensions=caption_extensions(deep=True))
+    assert caption_html(rendered, md) == expected
+    assert [caption["id"] for caption in md.captions] == [
+        "_figure-1",
+        "_figure-2",
+        "_table-1",
+        "_figure-3",
+        "_figure-4",
+    ]
+    # nested paragraphs are left alone without deep
+    md = markdown.Markdown(extensions=caption_extensions())
+    caption_html(rendered, md)
+    assert len(md.captions) == 2
@@ -248,3 +248,100 @@ def test_combined_options():
         ],
     )
     assert out_string == expected_string
+
+
+def test_compact():
+    in_string = """\
+![alt text](/path/to/image.png "Title")
+
+[![alt text](/path/to/image.png "Linked")](/target)"""
+    expected_string = (
+        '<figure id="f1"><img alt="alt text" src="/path/to/image.png" />'
+        "<figcaption><span>Figure&nbsp;1:</span> Title</figcaption></figure>"
+        '<figure id="f2"><a href="/target"><img alt="alt text" '
+        'src="/path/to/image.png" /></a>'
+        "<figcaption><span>Figure&nbsp;2:</span> Linked</figcaption></figure>"
+    )
+    out_string = markdown.markdown(
+        in_string,
+        extensions=[ImageCaptionExtension(compact=True, id_format="f{number}")],
+    )
+    assert out_string == expected_string
+
+
+def test_gallery():
+    in_string = """\
+Holiday {#fig:holiday}
+![a](/a.png "Beach {#fig:beach}")
+[![b](/b.png "Hills")](/b)
+![c](/c.png)
+
+![d](/d.png "Single")"""
+    expected_string = """\
+<figure class="gallery" id="_figure-1">
+<figure id="_figure-1a">
+<img alt="a" src="/a.png" />
+<figcaption><span>Figure&nbsp;1a:</span> Beach</figcaption>
+</figure>
+<figure id="_figure-1b">
+<a href="/b"><img alt="b" src="/b.png" /></a>
+<figcaption><span>Figure&nbsp;1b:</span> Hills</figcaption>
+</figure>
+<figure id="_figure-1c">
+<img alt="c" src="/c.png" />
+<figcaption><span>Figure&nbsp;1c</span></figcaption>
+</figure>
+<figcaption><span>Figure&nbsp;1:</span> Holiday</figcaption>
+</figure>
+<figure id="_figure-2">
+<img alt="d" src="/d.png" />
+<figcaption><span>Figure&nbsp;2:</span> Single</figcaption>
+</figure>"""
+    md = markdown.Markdown(extensions=[ImageCaptionExtension(gallery=True)])
+    assert md.convert(in_string) == expected_string
+    assert [
+        (caption["kind"], caption["number"], caption["label"])
+        for caption in md.captions
+    ] == [
+        ("figure", 1, "fig:holiday"),
+        ("subfigure", "1a", "fig:beach"),
+        ("subfigure", "1b", None),
+        ("subfigure", "1c", None),
+        ("figure", 2, None),
+    ]
+
+
+def test_gallery_inline_caption():
+    in_string = 'See [docs](/d) and *this* ![a](/a.png "A") ![b](/b.png "B")'
+    expected_string = """\
+<figure class="gallery" id="_figure-1">
+<figure id="_figure-1a">
+<img alt="a" src="/a.png" />
+<figcaption><span>Figure&nbsp;1a:</span> A</figcaption>
+</figure>
+<figure id="_figure-1b">
+<img alt="b" src="/b.png" />
+<figcaption><span>Figure&nbsp;1b:</span> B</figcaption>
+</figure>
+<figcaption><span>Figure&nbsp;1:</span> See <a href="/d">docs</a> and <em>this</em></figcaption>
+</figure>"""
+    md = markdown.Markdown(extensions=[ImageCaptionExtension(gallery=True)])
+    assert md.convert(in_string) == expected_string
+    assert md.captions[0]["title"] == "See docs and this"
+
+
+def test_gallery_without_title():
+    in_string = "\n".join('![{0}](/{0}.png "{0}")'.format(i) for i in range(28))
+    out_string = markdown.markdown(
+        in_string, extensions=[ImageCaptionExtension(gallery=True, gallery_class="")]
+    )
+    assert out_string.startswith('<figure id="_figure-1">\n<figure id="_figure-1a">')
+    assert '<figure id="_figure-1ab">' in out_string
+    assert out_string.count("<img ") == 28
+    assert out_string.endswith("</figcaption>\n</figure>\n</figure>")
+
+
+def test_several_images_without_gallery():
+    in_string = '![a](/a.png "A") ![b](/b.png "B")'
+    out_string = markdown.markdown(in_string, extensions=[ImageCaptionExtension()])
+    assert out_string.count("<img ") == 1
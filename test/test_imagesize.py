@@ -0,0 +1,170 @@
+# caption - Manage markdown captions
+#
+# Copyright (c) 2020-2023 flywire
+# Copyright (c) 2023 sanzoghenzo
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+import os
+import struct
+import zlib
+
+import markdown
+
+from caption import ImageCaptionExtension
+from caption.imagesize import ImageSizeCache, image_size, resolve_image_path
+
+
+def png(width, height):
+    header = struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)
+    chunk = b"IHDR" + header
+    return (
+        b"\x89PNG\r\n\x1a\n"
+        + struct.pack(">I", len(header))
+        + chunk
+        + struct.pack(">I", zlib.crc32(chunk) & 0xFFFFFFFF)
+    )
+
+
+def jpeg(width, height):
+    app0 = b"JFIF\0" + b"\0" * 9
+    exif = b"\0" * 10000
+    frame = struct.pack(">BHHB", 8, height, width, 3) + b"\0" * 9
+    return (
+        b"\xff\xd8"
+        + b"\xff\xe0"
+        + struct.pack(">H", len(app0) + 2)
+        + app0
+        + b"\xff\xe1"
+        + struct.pack(">H", len(exif) + 2)
+        + exif
+        + b"\xff\xc0"
+        + struct.pack(">H", len(frame) + 2)
+        + frame
+    )
+
+
+def gif(width, height):
+    return b"GIF89a" + struct.pack("<HH", width, height) + b"\0" * 10
+
+
+def webp(width, height):
+    bits = (width - 1) | ((height - 1) << 14)
+    chunk = b"VP8L" + struct.pack("<I", 5) + b"\x2f" + struct.pack("<I", bits)
+    return b"RIFF" + struct.pack("<I", 4 + len(chunk)) + b"WEBP" + chunk
+
+
+def write(directory, name, data):
+    path = os.path.join(str(directory), name)
+    with open(path, "wb") as image_file:
+        image_file.write(data)
+    return path
+
+
+def test_image_size(tmp_path):
+    assert image_size(write(tmp_path, "a.png", png(640, 480))) == (640, 480)
+    assert image_size(write(tmp_path, "a.jpg", jpeg(800, 600))) == (800, 600)
+    assert image_size(write(tmp_path, "a.gif", gif(16, 32))) == (16, 32)
+    assert image_size(write(tmp_path, "a.webp", webp(300, 200))) == (300, 200)
+    svg = b'<?xml version="1.0"?>\n<svg xmlns="http://www.w3.org/2000/svg" width="120px" height="80">'
+    assert image_size(write(tmp_path, "a.svg", svg)) == (120, 80)
+    svg = b'<svg viewBox="0 0 100.5 50" width="100%">'
+    assert image_size(write(tmp_path, "b.svg", svg)) == (100, 50)
+
+
+def test_unknown_image(tmp_path):
+    assert image_size(write(tmp_path, "a.txt", b"not an image")) is None
+    assert image_size(write(tmp_path, "b.png", b"\x89PNG\r\n\x1a\n")) is None
+    assert image_size(str(tmp_path / "missing.png")) is None
+
+
+def test_resolve_image_path():
+    assert resolve_image_path("/img/a%20b.png", "site") == os.path.join(
+        "site", "img/a b.png"
+    )
+    assert resolve_image_path("a.png?v=2") == os.path.join(os.curdir, "a.png")
+    assert resolve_image_path("https://example.com/a.png") is None
+    assert resolve_image_path("//example.com/a.png") is None
+    assert resolve_image_path("data:image/png;base64,AAAA") is None
+
+
+def test_cache(tmp_path, monkeypatch):
+    path = write(tmp_path, "a.png", png(10, 20))
+    state = str(tmp_path / "sizes.json")
+    cache = ImageSizeCache(state)
+    assert cache.get(path) == (10, 20)
+    cache.save()
+
+    calls = []
+    monkeypatch.setattr(
+        "caption.imagesize.image_size", lambda path: calls.append(path) or (1, 1)
+    )
+    cache = ImageSizeCache(state)
+    assert cache.get(path) == (10, 20)
+    assert calls == []
+
+    # a modified file is read again
+    write(tmp_path, "a.png", png(30, 40) + b"\0")
+    assert cache.get(path) == (1, 1)
+    assert calls == [path]
+
+
+def test_cache_shared_file(tmp_path):
+    first = write(tmp_path, "a.png", png(10, 20))
+    second = write(tmp_path, "b.gif", gif(30, 40))
+    state = str(tmp_path / "sizes.json")
+    # two worker processes, each with its own copy of the cache
+    worker_a = ImageSizeCache(state)
+    worker_b = ImageSizeCache(state)
+    assert worker_a.get(first) == (10, 20)
+    assert worker_b.get(second) == (30, 40)
+    worker_a.save()
+    worker_b.save()
+    assert sorted(ImageSizeCache(state).entries) == sorted(
+        [os.path.abspath(first), os.path.abspath(second)]
+    )
+
+
+def test_dimensions(tmp_path):
+    write(tmp_path, "a.png", png(640, 480))
+    state = tmp_path / "sizes.json"
+    in_string = """\
+![alt text](/a.png "Title")
+
+![alt text](/missing.png "Other")
+
+![alt text](https://example.com/a.png "Remote")"""
+    md = markdown.Markdown(
+        extensions=[
+            ImageCaptionExtension(
+                image_dimensions=True, image_root=str(tmp_path), image_cache=str(state)
+            )
+        ]
+    )
+    out_string = md.convert(in_string)
+    assert '<img alt="alt text" height="480" src="/a.png" width="640" />' in out_string
+    assert '<img alt="alt text" src="/missing.png" />' in out_string
+    assert '<img alt="alt text" src="https://example.com/a.png" />' in out_string
+    assert state.exists()
+
+
+def test_explicit_dimensions(tmp_path):
+    write(tmp_path, "a.png", png(640, 480))
+    in_string = '![alt text](a.png "Title"){: width="100" }'
+    out_string = markdown.markdown(
+        in_string,
+        extensions=[
+            "attr_list",
+            ImageCaptionExtension(image_dimensions=True, image_root=str(tmp_path)),
+        ],
+    )
+    assert 'width="100"' in out_string
+    assert "640" not in out_string
+
+
+def test_no_dimensions_by_default(tmp_path):
+    write(tmp_path, "a.png", png(640, 480))
+    out_string = markdown.markdown(
+        '![alt text](a.png "Title")',
+        extensions=[ImageCaptionExtension(image_root=str(tmp_path))],
+    )
+    assert "width" not in out_string
@@ -6,9 +6,19 @@
 # Copyright (c) 2019 Philipp Trommler
 #
 # SPDX-License-Identifier: GPL-3.0-or-later
+from xml.etree import ElementTree
+
 import markdown
+import pytest
 
-from caption.caption import CaptionExtension
+from caption.caption import (
+    CaptionContext,
+    CaptionExtension,
+    ListingCaptionTreeProcessor,
+    PrefixMatcher,
+    get_dispatcher,
+    has_marker,
+)
 
 
 def test_listing():
@@ -20,3 +30,212 @@ Listing: Simple listing test"""
 </div class=listing>"""
     out_string = markdown.markdown(in_string, extensions=[CaptionExtension()])
     assert out_string == expected_string
+
+
+KINDS = [
+    {"name": "equation", "prefix": "Equation: "},
+    {"name": "algorithm", "prefix": "Algorithm: ", "caption_prefix": "Algo"},
+    {"name": "code", "prefix": "Code: ", "content_tag": "figure", "content_class": ""},
+]
+
+
+def test_kinds():
+    in_string = """\
+Equation: First equation
+
+Listing: A listing
+
+Algorithm: Sort
+
+Equation: Second equation
+
+Code: Snippet"""
+    expected_string = """\
+<div class="equation" id="_equation-1">
+<figcaption><span>Equation&nbsp;1:</span> First equation</figcaption>
+</div>
+<div class=listing id="_listing-1">
+<figcaption><span>Listing&nbsp;1:</span> A listing</figcaption>
+</div class=listing>
+<div class="algorithm" id="_algorithm-1">
+<figcaption><span>Algo&nbsp;1:</span> Sort</figcaption>
+</div>
+<div class="equation" id="_equation-2">
+<figcaption><span>Equation&nbsp;2:</span> Second equation</figcaption>
+</div>
+<figure id="_code-1">
+<figcaption><span>Code&nbsp;1:</span> Snippet</figcaption>
+</figure>"""
+    out_string = markdown.markdown(in_string, extensions=[CaptionExtension(kinds=KINDS)])
+    assert out_string == expected_string
+
+
+def test_localized_listing_kind():
+    in_string = "Listado: Ejemplo\n\nListing: Not a caption"
+    out_string = markdown.markdown(
+        in_string,
+        extensions=[
+            CaptionExtension(
+                kinds=[{"name": "listing", "prefix": "Listado: ", "caption_prefix": "Listado"}]
+            )
+        ],
+    )
+    assert out_string == """\
+<div class="listing" id="_listing-1">
+<figcaption><span>Listado&nbsp;1:</span> Ejemplo</figcaption>
+</div>
+<p>Listing: Not a caption</p>"""
+
+
+def test_prefix_matcher():
+    matcher = PrefixMatcher({"Code: ": 1, "Code block: ": 2, "Eq: ": 3})
+    assert matcher.match("Code: x") == 1
+    assert matcher.match("Code block: x") == 2
+    assert matcher.match("Eq: x") == 3
+    assert matcher.match("Equation: x") is None
+    assert matcher.match("") is None
+
+
+def test_many_kinds_records():
+    kinds = [{"name": "kind{}".format(i), "prefix": "Kind{}: ".format(i)} for i in range(200)]
+    in_string = "\n\n".join("Kind{0}: Title {0}".format(i % 200) for i in range(400))
+    md = markdown.Markdown(extensions=[CaptionExtension(kinds=kinds)])
+    md.convert(in_string)
+    assert [(c["kind"], c["number"]) for c in md.captions[198:202]] == [
+        ("kind198", 1),
+        ("kind199", 1),
+        ("kind0", 2),
+        ("kind1", 2),
+    ]
+
+
+CODE_SOURCE = """\
+Listing: Setup
+
+```python
+x = 1 < 2
+```
+
+``` { .python caption="From the fence" }
+y = 2
+```
+
+Listing: No code"""
+
+
+def test_code_blocks():
+    expected_string = """\
+<figure class="listing" id="_listing-1">
+<pre><code class="language-python">x = 1 &lt; 2
+</code></pre>
+<figcaption><span>Listing&nbsp;1:</span> Setup</figcaption>
+</figure>
+<figure class="listing" id="_listing-2">
+<pre><code class="language-python">y = 2
+</code></pre>
+<figcaption><span>Listing&nbsp;2:</span> From the fence</figcaption>
+</figure>
+<div class=listing id="_listing-3">
+<figcaption><span>Listing&nbsp;3:</span> No code</figcaption>
+</div class=listing>"""
+    md = markdown.Markdown(
+        extensions=["fenced_code", CaptionExtension(code_blocks=True)]
+    )
+    assert md.convert(CODE_SOURCE) == expected_string
+    assert [caption["title"] for caption in md.captions] == [
+        "Setup",
+        "From the fence",
+        "No code",
+    ]
+
+
+def test_indented_code_block():
+    in_string = "Listing: Indented\n\n    x = 1 < 2"
+    out_string = markdown.markdown(
+        in_string, extensions=[CaptionExtension(code_blocks=True)]
+    )
+    assert out_string == """\
+<figure class="listing" id="_listing-1">
+<pre><code>x = 1 &lt; 2
+</code></pre>
+<figcaption><span>Listing&nbsp;1:</span> Indented</figcaption>
+</figure>"""
+
+
+def test_code_blocks_shared_processor():
+    processor = ListingCaptionTreeProcessor(code_blocks=True)
+    for _ in range(2):
+        md = markdown.Markdown(extensions=["fenced_code"])
+        get_dispatcher(md).register(processor, "listingcaptiontreeprocessor", 8)
+        # without the extension, the fence attribute is not turned into a caption
+        assert md.convert(CODE_SOURCE).count("<figure") == 1
+        assert len(md.captions) == 2
+
+
+def test_code_block_pure():
+    # codehilite stashes its blocks with a final newline
+    md = markdown.Markdown(extensions=["fenced_code", "codehilite"])
+    md.convert("```\nx\n```")
+    blocks = list(md.htmlStash.rawHtmlBlocks)
+    placeholder = ElementTree.Element("p")
+    placeholder.text = md.htmlStash.get_placeholder(0)
+    processor = ListingCaptionTreeProcessor(code_blocks=True)
+    assert processor.code_block(placeholder, CaptionContext(md))
+    assert md.htmlStash.rawHtmlBlocks == blocks
+
+
+def test_code_blocks_options():
+    out_string = markdown.markdown(
+        CODE_SOURCE,
+        extensions=[
+            "fenced_code",
+            "codehilite",
+            CaptionExtension(code_blocks=True, caption_top=True, compact=True),
+        ],
+    )
+    assert out_string.startswith(
+        '<figure class="listing" id="_listing-1"><figcaption>'
+        "<span>Listing&nbsp;1:</span> Setup</figcaption>"
+        '<div class="codehilite">'
+    )
+    assert out_string.count("<figure") == 2
+
+
+def test_code_blocks_opt_in():
+    out_string = markdown.markdown(
+        CODE_SOURCE, extensions=["fenced_code", CaptionExtension()]
+    )
+    assert "<figure" not in out_string
+    assert out_string.count("<div class=listing") == 2
+    out_string = markdown.markdown(
+        CODE_SOURCE,
+        extensions=[
+            "fenced_code",
+            CaptionExtension(code_blocks=True, code_attribute=""),
+        ],
+    )
+    assert out_string.count("<figure") == 1
+
+
+def test_kind_aliases():
+    kinds = [{"name": "equation", "prefix": "Eq: ", "tag": "figure", "class": "eq"}]
+    out_string = markdown.markdown(
+        "Eq: E = mc2", extensions=[CaptionExtension(kinds=kinds)]
+    )
+    assert out_string == """\
+<figure class="eq" id="_equation-1">
+<figcaption><span>Eq&nbsp;1:</span> E = mc2</figcaption>
+</figure>"""
+
+
+def test_kind_unknown_option():
+    kinds = [{"name": "equation", "prefix": "Eq: ", "colour": "red"}]
+    with pytest.raises(KeyError, match="'colour'"):
+        markdown.Markdown(extensions=[CaptionExtension(kinds=kinds)])
+
+
+def test_kinds_marker():
+    md = markdown.Markdown(extensions=[CaptionExtension(kinds=KINDS)])
+    marker = get_dispatcher(md).processors["listingcaptiontreeprocessor"].marker
+    assert has_marker("text\n\nAlgorithm: x", marker)
+    assert not has_marker("Equation and Code but no prefix", marker)
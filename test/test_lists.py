@@ -0,0 +1,95 @@
+# caption - Manage markdown captions
+#
+# Copyright (c) 2020-2023 flywire
+# Copyright (c) 2023 sanzoghenzo
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+import markdown
+
+from caption import (
+    CaptionExtension,
+    CaptionListExtension,
+    ImageCaptionExtension,
+    TableCaptionExtension,
+)
+
+SOURCE = """\
+[LOF]
+
+![a](/a.png "First")
+
+[LOT]
+
+Table: Values
+
+| a |
+|---|
+| 1 |
+
+![b](/b.png)
+
+Listing: Code"""
+
+
+def make_md(**options):
+    return markdown.Markdown(
+        extensions=[
+            "tables",
+            ImageCaptionExtension(),
+            TableCaptionExtension(),
+            CaptionExtension(),
+            CaptionListExtension(**options),
+        ]
+    )
+
+
+def test_lists():
+    out_string = make_md().convert(SOURCE)
+    assert out_string.startswith(
+        """\
+<div class="caption-list figure-list">
+<ul>
+<li><a href="#_figure-1">Figure&nbsp;1: First</a></li>
+<li><a href="#_figure-2">Figure&nbsp;2</a></li>
+</ul>
+</div>
+<figure id="_figure-1">"""
+    )
+    assert (
+        """\
+<div class="caption-list table-list">
+<ul>
+<li><a href="#_table-1">Table&nbsp;1: Values</a></li>
+</ul>
+</div>"""
+        in out_string
+    )
+    assert "[LO" not in out_string
+
+
+def test_reuse():
+    md = make_md()
+    first = md.convert(SOURCE)
+    assert md.reset().convert(SOURCE) == first
+    out_string = md.reset().convert("[LOL]\n\nListing: Other")
+    assert '<li><a href="#_listing-1">Listing&nbsp;1: Other</a></li>' in out_string
+    assert "_figure" not in out_string
+
+
+def test_markers():
+    md = make_md(markers={"[Figures]": "figure"}, list_class="")
+    out_string = md.convert(SOURCE.replace("[LOF]", "[Figures]"))
+    assert out_string.startswith('<div class="figure-list">')
+    assert "<p>[LOT]</p>" in out_string
+
+
+def test_not_a_marker():
+    md = make_md()
+    out_string = md.convert("Text [LOF]\n\n*[LOF]*\n\n![a](/a.png)")
+    assert "<p>Text [LOF]</p>" in out_string
+    assert "<p><em>[LOF]</em></p>" in out_string
+
+
+def test_empty_list():
+    out_string = make_md().convert("[LOT]")
+    assert out_string == '<div class="caption-list table-list">\n<ul>\n</ul>\n</div>'
@@ -0,0 +1,118 @@
+# caption - Manage markdown captions
+#
+# Copyright (c) 2020-2023 flywire
+# Copyright (c) 2023 sanzoghenzo
+# forked from yafg - https://git.sr.ht/~ferruck/yafg
+# Copyright (c) 2019 Philipp Trommler
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+import logging
+
+import markdown
+
+from caption import (
+    CaptionExtension,
+    CrossReferenceExtension,
+    ImageCaptionExtension,
+    TableCaptionExtension,
+)
+
+LABELLED_MD = """\
+See [@fig:arch], [@tbl:syntax] and [@lst:code].
+
+![alt text](/path/to/image.png "Architecture {#fig:arch}")
+
+Table: Syntax {#tbl:syntax}
+
+| Syntax      | Description |
+| ----------- | ----------- |
+| Header      | Title       |
+
+Listing: Code {#lst:code}"""
+
+
+def all_extensions(**kwargs):
+    return [
+        "tables",
+        ImageCaptionExtension(),
+        TableCaptionExtension(),
+        CaptionExtension(),
+        CrossReferenceExtension(**kwargs),
+    ]
+
+
+def test_references():
+    md = markdown.Markdown(extensions=all_extensions())
+    out_string = md.convert(LABELLED_MD)
+    assert out_string.startswith(
+        '<p>See <a href="#_figure-1">Figure&nbsp;1</a>, '
+        '<a href="#_table-1">Table&nbsp;1</a> and '
+        '<a href="#_listing-1">Listing&nbsp;1</a>.</p>'
+    )
+    assert "<figcaption><span>Figure&nbsp;1:</span> Architecture</figcaption>" in out_string
+    assert "<caption><span>Table&nbsp;1:</span> Syntax</caption>" in out_string
+    assert "{#" not in out_string
+    assert md.caption_unresolved == []
+    assert [caption["label"] for caption in md.captions] == [
+        "fig:arch",
+        "tbl:syntax",
+        "lst:code",
+    ]
+
+
+def test_forward_and_backward_references():
+    in_string = """\
+![alt](/a.png "First {#fig:a}")
+
+![alt](/b.png "Second {#fig:b}")
+
+Both [@fig:b] and [@fig:a]."""
+    out_string = markdown.markdown(in_string, extensions=all_extensions())
+    assert out_string.endswith(
+        '<p>Both <a href="#_figure-2">Figure&nbsp;2</a> and '
+        '<a href="#_figure-1">Figure&nbsp;1</a>.</p>'
+    )
+
+
+def test_reference_class():
+    in_string = '![alt](/a.png "First {#fig:a}")\n\nSee [@fig:a].'
+    out_string = markdown.markdown(
+        in_string, extensions=all_extensions(reference_class="xref")
+    )
+    assert '<a class="xref" href="#_figure-1">Figure&nbsp;1</a>' in out_string
+
+
+def test_unresolved(caplog):
+    md = markdown.Markdown(extensions=all_extensions())
+    with caplog.at_level(logging.WARNING, logger="MARKDOWN"):
+        out_string = md.convert("See [@fig:missing].")
+    assert out_string == '<p>See <span class="unresolved">[@fig:missing]</span>.</p>'
+    assert md.caption_unresolved == ["fig:missing"]
+    assert "fig:missing" in caplog.text
+
+
+def test_attr_list_label():
+    in_string = """\
+Listing: Code
+{: #lst:code }
+
+See [@lst:code]."""
+    out_string = markdown.markdown(in_string, extensions=["attr_list"] + all_extensions())
+    assert '<a href="#_listing-1">Listing&nbsp;1</a>' in out_string
+
+
+def test_reuse_instance():
+    md = markdown.Markdown(extensions=all_extensions())
+    first = md.convert(LABELLED_MD)
+    assert md.reset().convert(LABELLED_MD) == first
+
+
+def test_many_references():
+    figures = "\n\n".join(
+        '![alt](/{0}.png "Figure {0} {{#fig:{0}}}")'.format(index) for index in range(500)
+    )
+    references = " ".join("[@fig:{}]".format(index % 500) for index in range(5000))
+    md = markdown.Markdown(extensions=all_extensions())
+    out_string = md.convert(figures + "\n\n" + references)
+    assert md.caption_unresolved == []
+    assert out_string.count('<a href="#_figure-500">Figure&nbsp;500</a>') == 10
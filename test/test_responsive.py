@@ -0,0 +1,142 @@
+# caption - Manage markdown captions
+#
+# Copyright (c) 2020-2023 flywire
+# Copyright (c) 2023 sanzoghenzo
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+import os
+import shutil
+
+import markdown
+import pytest
+
+from caption import ImageCaptionExtension
+from caption.responsive import VariantCache
+
+from .test_imagesize import png, write
+
+SOURCE = """\
+![first](/a.png "First")
+
+![second](/a.png "Second")
+
+![third](https://example.com/c.png "Third")"""
+
+
+def fake_scale(calls):
+    def scale(self, path, target, width):
+        calls.append((os.path.basename(path), width))
+        shutil.copy(path, target)
+
+    return scale
+
+
+def test_lazy_loading():
+    md = markdown.Markdown(extensions=[ImageCaptionExtension(lazy_loading=True)])
+    out_string = md.convert(SOURCE)
+    assert '<img alt="first" src="/a.png" />' in out_string
+    assert (
+        '<img alt="second" decoding="async" loading="lazy" src="/a.png" />'
+        in out_string
+    )
+    assert out_string.count('loading="lazy"') == 2
+
+    md = markdown.Markdown(
+        extensions=[ImageCaptionExtension(lazy_loading=True, eager_figures=0)]
+    )
+    assert md.convert(SOURCE).count('loading="lazy"') == 3
+
+
+def test_srcset(tmp_path, monkeypatch):
+    calls = []
+    monkeypatch.setattr(VariantCache, "scale", fake_scale(calls))
+    monkeypatch.setattr("caption.responsive.pillow_available", lambda: True)
+    write(tmp_path, "a.png", png(1200, 800))
+    variants = tmp_path / "variants"
+
+    def convert():
+        md = markdown.Markdown(
+            extensions=[
+                ImageCaptionExtension(
+                    image_root=str(tmp_path),
+                    srcset_widths=[480, 960, 1600],
+                    variant_cache=str(variants),
+                    variant_url="/_variants/",
+                )
+            ]
+        )
+        return md.convert(SOURCE)
+
+    out_string = convert()
+    assert out_string.count("srcset=") == 2
+    assert "/_variants/" in out_string
+    assert "480w, /_variants/" in out_string
+    assert "960w, /a.png 1200w" in out_string
+    assert "1600w" not in out_string
+    # identical images share their variants
+    assert sorted(calls) == [("a.png", 480), ("a.png", 960)]
+    assert (variants / "index.json").exists()
+
+    # the next build reuses the variants
+    del calls[:]
+    assert convert() == out_string
+    assert calls == []
+
+
+def test_srcset_without_pillow(tmp_path, monkeypatch):
+    monkeypatch.setattr("caption.responsive.pillow_available", lambda: False)
+    extension = ImageCaptionExtension(
+        srcset_widths=[480], variant_cache=str(tmp_path / "variants")
+    )
+    with pytest.raises(ImportError, match="Pillow"):
+        markdown.Markdown(extensions=[extension])
+
+
+def test_variant_index_shared(tmp_path, monkeypatch):
+    monkeypatch.setattr(VariantCache, "scale", fake_scale([]))
+    first = write(tmp_path, "a.png", png(800, 600))
+    second = write(tmp_path, "b.png", png(800, 601))
+    directory = str(tmp_path / "variants")
+    # two worker processes, each with its own copy of the index
+    worker_a = VariantCache(directory)
+    worker_b = VariantCache(directory)
+    worker_a.variant(first, 400)
+    worker_b.variant(second, 400)
+    worker_a.save()
+    worker_b.save()
+    assert sorted(VariantCache(directory).index) == sorted(
+        [os.path.abspath(first), os.path.abspath(second)]
+    )
+
+
+def test_scale_failure(tmp_path):
+    pytest.importorskip("PIL.Image")
+    path = write(tmp_path, "a.png", b"not an image")
+    cache = VariantCache(str(tmp_path / "variants"))
+    with pytest.raises(Exception):
+        cache.variant(path, 100)
+    assert os.listdir(str(tmp_path / "variants")) == []
+
+
+def test_variant_cache_digest(tmp_path, monkeypatch):
+    calls = []
+    monkeypatch.setattr(VariantCache, "scale", fake_scale(calls))
+    first = write(tmp_path, "a.png", png(800, 600))
+    second = write(tmp_path, "b.png", png(800, 600))
+    cache = VariantCache(str(tmp_path / "variants"))
+    assert cache.variant(first, 400) == cache.variant(second, 400)
+    assert len(calls) == 1
+
+    write(tmp_path, "b.png", png(800, 601))
+    assert cache.variant(first, 400) != cache.variant(second, 400)
+    assert len(calls) == 2
+
+
+def test_scale(tmp_path):
+    image_module = pytest.importorskip("PIL.Image")
+    path = str(tmp_path / "a.png")
+    image_module.new("RGB", (400, 200)).save(path)
+    cache = VariantCache(str(tmp_path / "variants"))
+    name = cache.variant(path, 100)
+    with image_module.open(str(tmp_path / "variants" / name)) as variant:
+        assert variant.size == (100, 50)
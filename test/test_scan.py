@@ -0,0 +1,93 @@
+# caption - Manage markdown captions
+#
+# Copyright (c) 2020-2023 flywire
+# Copyright (c) 2023 sanzoghenzo
+# forked from yafg - https://git.sr.ht/~ferruck/yafg
+# Copyright (c) 2019 Philipp Trommler
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+import markdown
+
+from caption import CaptionExtension, ImageCaptionExtension, TableCaptionExtension
+from caption.scan import count_captions, number_offsets
+
+from .benchmarks import generate_document
+
+CHAPTER = """\
+# Chapter
+
+Some *emphasis* to start with, and an ![inline](/inline.png) image.
+
+* a list item with ![an image](/list.png)
+
+> ![quoted](/quote.png)
+
+    ![indented code](/code.png)
+
+```
+![fenced code](/fenced.png)
+
+Table: fenced
+```
+
+Table: A caption
+
+| a | b |
+| - | - |
+| 1 | 2 |
+
+Table: Not followed by a table
+
+Listing: A listing
+
+[![linked](/linked.png "Title")](/target.html)
+"""
+
+
+def render(source, offsets=None):
+    offsets = offsets or {"figure": 0, "table": 0, "listing": 0}
+    return markdown.markdown(
+        source,
+        extensions=[
+            "tables",
+            "fenced_code",
+            ImageCaptionExtension(number_offset=offsets["figure"]),
+            TableCaptionExtension(number_offset=offsets["table"]),
+            CaptionExtension(number_offset=offsets["listing"]),
+        ],
+    )
+
+
+def test_count_captions():
+    assert count_captions(CHAPTER) == {"figure": 2, "table": 1, "listing": 1}
+    out_string = render(CHAPTER)
+    assert out_string.count("<figure ") == 2
+    assert out_string.count("<caption>") == 1
+    assert out_string.count("<div class=listing ") == 1
+
+
+def test_count_generated_document():
+    source = generate_document(figures=40, tables=30, listings=20, prose=2)
+    assert count_captions(source) == {"figure": 40, "table": 30, "listing": 20}
+
+
+def test_count_empty():
+    assert count_captions("") == {"figure": 0, "table": 0, "listing": 0}
+
+
+def test_number_offsets():
+    chapters = [CHAPTER, "No captions here.", CHAPTER]
+    assert number_offsets(chapters) == [
+        {"figure": 0, "table": 0, "listing": 0},
+        {"figure": 2, "table": 1, "listing": 1},
+        {"figure": 2, "table": 1, "listing": 1},
+    ]
+
+
+def test_sharded_rendering():
+    chapters = [generate_document(3, 2, 1), generate_document(2, 1, 2)]
+    sharded = "\n".join(
+        render(chapter, offsets)
+        for chapter, offsets in zip(chapters, number_offsets(chapters))
+    )
+    assert sharded == render("\n\n".join(chapters))
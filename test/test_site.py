@@ -0,0 +1,125 @@
+# caption - Manage markdown captions
+#
+# Copyright (c) 2020-2023 flywire
+# Copyright (c) 2023 sanzoghenzo
+# forked from yafg - https://git.sr.ht/~ferruck/yafg
+# Copyright (c) 2019 Philipp Trommler
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+import re
+
+import markdown
+
+from caption import CaptionExtension
+from caption.batch import DEFAULT_EXTENSIONS, convert_tree
+from caption.site import (
+    SiteNumbering,
+    caption_prefixes,
+    count_records,
+    offset_configs,
+)
+
+FIGURES = '![alt](/a.png "A")\n\n![alt](/b.png "B")\n\nListing: Code\n'
+ONE_FIGURE = '![alt](/c.png "C")\n'
+NOTHING = "Nothing to caption.\n"
+
+
+def render(source, offsets):
+    md = markdown.Markdown(
+        extensions=DEFAULT_EXTENSIONS, extension_configs=offset_configs(offsets)
+    )
+    return md.convert(source), count_records(md.captions)
+
+
+def test_plan():
+    site = SiteNumbering()
+    offsets = site.plan([("a.md", FIGURES), ("b.md", NOTHING), ("c.md", ONE_FIGURE)])
+    assert offsets["a.md"] == {"figure": 0, "table": 0, "listing": 0}
+    assert offsets["b.md"] == {"figure": 2, "table": 0, "listing": 1}
+    assert offsets["c.md"] == {"figure": 2, "table": 0, "listing": 1}
+    html, _ = render(ONE_FIGURE, offsets["c.md"])
+    assert '<figure id="_figure-3">' in html
+
+
+def test_persisted_state(tmp_path):
+    state = str(tmp_path / "numbering.json")
+    pages = [("a.md", FIGURES), ("b.md", ONE_FIGURE), ("c.md", ONE_FIGURE)]
+    site = SiteNumbering(state)
+    site.plan(pages)
+    assert site.changed() == ["a.md", "b.md", "c.md"]
+    site.save()
+
+    site = SiteNumbering(state)
+    site.plan(pages)
+    assert site.changed() == []
+
+    site = SiteNumbering(state)
+    site.plan([("a.md", FIGURES), ("b.md", FIGURES), ("c.md", ONE_FIGURE)])
+    assert site.changed() == ["c.md"]
+
+
+def test_update_fixes_miscounted_pages():
+    # image syntax in inline code fools the scan, not the conversion
+    tricky = "Use `![alt](src)` for images.\n"
+    site = SiteNumbering()
+    offsets = site.plan([("a.md", tricky), ("b.md", ONE_FIGURE)])
+    assert offsets["b.md"]["figure"] == 1
+    counts = {name: render(source, offsets[name])[1] for name, source in [
+        ("a.md", tricky), ("b.md", ONE_FIGURE)
+    ]}
+    assert site.update(counts) == ["b.md"]
+    assert site.offsets["b.md"]["figure"] == 0
+    assert site.update(counts) == []
+
+
+def test_batch_continuous(tmp_path):
+    source = tmp_path / "docs"
+    source.mkdir()
+    (source / "1-intro.md").write_text(FIGURES)
+    (source / "2-usage.md").write_text("Use `![alt](src)`.\n\n" + ONE_FIGURE)
+    (source / "3-end.md").write_text(ONE_FIGURE)
+    state = str(tmp_path / "numbering.json")
+    convert_tree(str(source), str(tmp_path / "site"), jobs=2, numbering=state)
+    ids = [
+        re.findall(r'id="(_figure-\d+)"', (tmp_path / "site" / name).read_text())
+        for name in ["1-intro.html", "2-usage.html", "3-end.html"]
+    ]
+    assert ids == [["_figure-1", "_figure-2"], ["_figure-3"], ["_figure-4"]]
+
+
+def test_batch_renders_edited_pages(tmp_path):
+    source = tmp_path / "docs"
+    source.mkdir()
+    (source / "1-intro.md").write_text(FIGURES)
+    (source / "2-end.md").write_text(ONE_FIGURE)
+    site = tmp_path / "site"
+    state = str(tmp_path / "numbering.json")
+    result = convert_tree(str(source), str(site), jobs=1, numbering=state)
+    assert (result.files, result.unchanged) == (2, 0)
+    assert "2 files" in str(result)
+
+    result = convert_tree(str(source), str(site), jobs=1, numbering=state)
+    assert (result.files, result.unchanged) == (0, 2)
+
+    # one figure less on the first page moves the numbers of the second one
+    (source / "1-intro.md").write_text(ONE_FIGURE)
+    result = convert_tree(str(source), str(site), jobs=1, numbering=state)
+    assert (result.files, result.unchanged) == (2, 0)
+    assert 'id="_figure-2"' in (site / "2-end.html").read_text()
+
+    (site / "2-end.html").unlink()
+    result = convert_tree(str(source), str(site), jobs=1, numbering=state)
+    assert (result.files, result.unchanged) == (1, 1)
+
+
+def test_custom_kinds_planned():
+    md = markdown.Markdown(
+        extensions=[
+            CaptionExtension(kinds=[{"name": "equation", "prefix": "Equation: "}])
+        ]
+    )
+    prefixes = caption_prefixes(md)
+    assert prefixes == {"Listing: ": "listing", "Equation: ": "equation"}
+    site = SiteNumbering(prefixes=prefixes)
+    offsets = site.plan([("a.md", "Equation: E\n\n    e = mc^2\n"), ("b.md", "")])
+    assert offsets["b.md"]["equation"] == 1
@@ -0,0 +1,68 @@
+# caption - Manage markdown captions
+#
+# Copyright (c) 2020-2023 flywire
+# Copyright (c) 2023 sanzoghenzo
+# forked from yafg - https://git.sr.ht/~ferruck/yafg
+# Copyright (c) 2019 Philipp Trommler
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+import markdown
+
+from caption import CaptionExtension, ImageCaptionExtension, TableCaptionExtension
+from caption.stats import disable_stats, enable_stats
+
+SOURCE = """\
+![alt](/a.png "A")
+
+Table: Not a table
+
+Table: A table
+
+| a | b |
+| - | - |
+| 1 | 2 |
+
+Some text."""
+
+
+def make_md():
+    return markdown.Markdown(
+        extensions=[
+            "tables",
+            ImageCaptionExtension(),
+            TableCaptionExtension(),
+            CaptionExtension(),
+        ]
+    )
+
+
+def test_disabled_by_default():
+    md = make_md()
+    md.convert(SOURCE)
+    assert not hasattr(md, "caption_stats")
+
+
+def test_stats():
+    md = make_md()
+    collected = []
+    enable_stats(md, hook=collected.append)
+    out_string = md.convert(SOURCE)
+    stats = md.caption_stats
+    assert collected == [stats]
+    assert stats.captions == 2
+    assert {name: (s.scanned, s.matches, s.captions) for name, s in stats.processors.items()} == {
+        # the listing processor is skipped: the source has no listing marker
+        "listing": (0, 0, 0),
+        "figure": (4, 1, 1),
+        "table": (3, 1, 1),
+    }
+    assert stats.seconds >= stats.processors["figure"].seconds
+    assert set(stats.as_dict()["processors"]["table"]) == {
+        "scanned",
+        "matches",
+        "captions",
+        "seconds",
+    }
+    disable_stats(md)
+    assert md.reset().convert(SOURCE) == out_string
+    assert md.caption_stats is stats
@@ -6,9 +6,13 @@
 # Copyright (c) 2019 Philipp Trommler
 #
 # SPDX-License-Identifier: GPL-3.0-or-later
+import collections
+from xml.etree import ElementTree
+
 import markdown
 
 from caption import TableCaptionExtension
+from caption.table_caption import TableCaptionTreeProcessor
 
 
 def test_empty_input():
@@ -132,3 +136,109 @@ def test_caption_prefix():
 </table>""".format(TABLE_INNER_CONTENT)
     out_string = markdown.markdown(BASE_MD_TABLE, extensions=["tables", TableCaptionExtension(caption_prefix="Tabula")])
     assert out_string == expected_string
+
+
+def test_trailing_caption_paragraph():
+    in_string = BASE_MD_TABLE + "\nTable: Nothing follows"
+    out_string = markdown.markdown(in_string, extensions=["tables", TableCaptionExtension()])
+    assert out_string.endswith("</table>\n<p>Table: Nothing follows</p>")
+
+
+def test_caption_paragraph_without_table():
+    in_string = "Table: Not a table\n\n" + BASE_MD_TABLE
+    out_string = markdown.markdown(in_string, extensions=["tables", TableCaptionExtension()])
+    assert out_string.startswith("<p>Table: Not a table</p>\n<table id=\"_table-1\">")
+
+
+def build_tree(tables, element=ElementTree.Element):
+    root = element("div")
+    for index in range(tables):
+        par = ElementTree.SubElement(root, "p")
+        par.text = "Table: Title {}".format(index)
+        ElementTree.SubElement(root, "table")
+        ElementTree.SubElement(root, "p").text = "Some text"
+    return root
+
+
+class CountingElement(ElementTree.Element):
+    """Element counting the calls to its child list operations."""
+
+    calls = collections.Counter()
+
+    def __iter__(self):
+        self.calls["iter"] += 1
+        return iter(ElementTree.Element.__getitem__(self, slice(None)))
+
+    def __getitem__(self, index):
+        self.calls["getitem"] += 1
+        return ElementTree.Element.__getitem__(self, index)
+
+    def __setitem__(self, index, value):
+        self.calls["setitem"] += 1
+        ElementTree.Element.__setitem__(self, index, value)
+
+    def __delitem__(self, index):
+        self.calls["delitem"] += 1
+        ElementTree.Element.__delitem__(self, index)
+
+    def insert(self, index, element):
+        self.calls["insert"] += 1
+        ElementTree.Element.insert(self, index, element)
+
+    def remove(self, element):
+        self.calls["remove"] += 1
+        ElementTree.Element.remove(self, element)
+
+    def find(self, path, namespaces=None):
+        self.calls["find"] += 1
+        return ElementTree.Element.find(self, path, namespaces)
+
+    def iter(self, tag=None):
+        self.calls["iter"] += 1
+        return ElementTree.Element.iter(self, tag)
+
+
+def test_many_tables():
+    root = build_tree(5000)
+    TableCaptionTreeProcessor(caption_prefix="Table").run(root)
+    tables = root.findall("./table")
+    assert len(root) == 10000
+    assert [table.get("id") for table in tables] == [
+        "_table-{}".format(index + 1) for index in range(5000)
+    ]
+    assert tables[-1].find("caption/span").tail == " Title 4999"
+
+
+def test_linear_scaling():
+    def parent_calls(tables):
+        root = build_tree(tables, CountingElement)
+        CountingElement.calls.clear()
+        TableCaptionTreeProcessor(caption_prefix="Table").run(root)
+        assert len(root) == 2 * tables
+        return dict(CountingElement.calls)
+
+    # each of these operations on the parent is linear in its children: one
+    # per table would make the pass quadratic
+    assert parent_calls(400) == parent_calls(1600) == {"iter": 1, "setitem": 1}
+
+
+def test_compact():
+    in_string = """\
+Table: Example
+
+| a |
+|---|
+| 1 |"""
+    out_string = markdown.markdown(
+        in_string,
+        extensions=[
+            "tables",
+            TableCaptionExtension(caption_top=False, compact=True, id_format="t{number}"),
+        ],
+    )
+    assert '<table id="t1">' in out_string
+    assert (
+        '<caption class="caption-bottom"><span>Table&nbsp;1:</span> Example</caption>'
+        in out_string
+    )
+    assert "style=" not in out_string